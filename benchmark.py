@@ -0,0 +1,217 @@
+"""Замеры производительности обрезки на синтетических скриншотах.
+
+Пример:
+    python benchmark.py --repeat 5 --workers 4
+    python benchmark.py --compare data/benchmarks/старый.json
+
+Результат сохраняется в JSON (по-умолчанию `data/benchmarks/<коммит>_<время>.json`),
+чтобы сравнивать запуски между коммитами.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import image_processing as imp
+from utils.git_revision import current_commit
+from utils.synthetic_screens import encode, iter_cases
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path("data", "benchmarks")
+
+
+def _time_ms(func: Callable, repeat: int) -> list[float]:
+    result = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def _summary(times: list[float]) -> dict[str, float]:
+    return {
+        "mean_ms": round(statistics.fmean(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+    }
+
+
+def bench_stages(cases: list[tuple[str, np.ndarray, bytes]], repeat: int) -> dict:
+    """Время отдельных этапов по всем изображениям"""
+
+    params = imp.NAV_BAR_PARAMS
+    stages: dict[str, list[float]] = {}
+
+    def add(stage: str, func: Callable, *args, **kwargs):
+        stages.setdefault(stage, []).extend(_time_ms(lambda: func(*args, **kwargs), repeat))
+
+    for _, img, data in cases:
+        height = img.shape[0]
+        nav_strip = img[height - int(height * 0.06) :]
+
+        add("decode", cv2.imdecode, np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        add("navigation_bar", imp._detect_navigation_bar, img, **params)
+        add(
+            "navigation_buttons",
+            imp._count_navigation_buttons,
+            nav_strip,
+            params["white_threshold"],
+            params["min_button_area"],
+        )
+        add("black_bg_projection", imp._crop_sreenshot_black_bg, img)
+        add("black_bg_contours", imp._crop_sreenshot_black_bg, img, method="contours")
+        add("encode", cv2.imencode, ".jpg", img)
+        add("create_cropped_image", imp.create_cropped_image_bytes, data)
+
+    return {stage: _summary(times) for stage, times in stages.items()}
+
+
+def _crop_one(data: bytes) -> int:
+    return len(imp.create_cropped_image_bytes(data))
+
+
+def bench_throughput(datas: list[bytes], workers: int, rounds: int) -> float:
+    """Изображений в секунду: в текущем потоке (`workers` = 1) или в пуле процессов"""
+
+    jobs = datas * rounds
+    started = time.perf_counter()
+    if workers <= 1:
+        for data in jobs:
+            _crop_one(data)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_crop_one, jobs, chunksize=2))
+    return round(len(jobs) / (time.perf_counter() - started), 2)
+
+
+def bench_memory(datas: list[bytes]) -> dict:
+    """Пиковая память при обработке по одному изображению.
+
+    tracemalloc видит выделения numpy, но не внутренние буферы OpenCV,
+    поэтому дополнительно сохраняется пиковый RSS процесса."""
+
+    tracemalloc.start()
+    for data in datas:
+        _crop_one(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "tracemalloc_peak_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+    }
+
+
+def run(repeat: int = 3, workers: int = 1, rounds: int = 2, quick: bool = False) -> dict:
+    imp.geometry_cache = None  # меряем полный анализ
+    imp.crop_logger.setLevel("WARNING")
+    imp.logger.setLevel("ERROR")
+
+    cases = [(name, img, encode(img)) for name, img in iter_cases()]
+    if quick:  # только самое большое разрешение
+        biggest = max(img.shape for _, img, _ in cases)
+        cases = [c for c in cases if c[1].shape == biggest]
+    datas = [data for _, _, data in cases]
+    logger.info("Изображений: %d, повторов: %d, процессов: %d", len(cases), repeat, workers)
+
+    result = {
+        "commit": current_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "images": [name for name, _, _ in cases],
+        "repeat": repeat,
+        "memory": bench_memory(datas),
+        "stages": bench_stages(cases, repeat),
+        "images_per_second": {"1": bench_throughput(datas, 1, rounds)},
+    }
+    if workers > 1:
+        result["images_per_second"][str(workers)] = bench_throughput(datas, workers, rounds)
+
+    return result
+
+
+def compare(current: dict, previous: dict):
+    """Выводит в лог изменение медианного времени этапов и скорости"""
+
+    logger.info("Сравнение с коммитом %s (%s):", previous.get("commit"), previous.get("date"))
+    for stage, values in current["stages"].items():
+        old = previous.get("stages", {}).get(stage)
+        if not old:
+            continue
+        change = (values["median_ms"] / old["median_ms"] - 1) * 100 if old["median_ms"] else 0
+        logger.info(
+            "  %-22s %8.2f мс -> %8.2f мс (%+.1f%%)",
+            stage,
+            old["median_ms"],
+            values["median_ms"],
+            change,
+        )
+    for workers, ips in current["images_per_second"].items():
+        old_ips = previous.get("images_per_second", {}).get(workers)
+        if old_ips:
+            logger.info(
+                "  изобр./сек (%s проц.): %.2f -> %.2f (%+.1f%%)",
+                workers,
+                old_ips,
+                ips,
+                (ips / old_ips - 1) * 100,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности обрезки")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого этапа")
+    parser.add_argument("--rounds", type=int, default=2, help="проходов по всем изображениям")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="процессов для замера пула"
+    )
+    parser.add_argument("--quick", action="store_true", help="только самое большое разрешение")
+    parser.add_argument("--output", type=Path, help="файл для результата (JSON)")
+    parser.add_argument("--compare", type=Path, help="результат прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    log_format = "[%(asctime)s] %(levelname)s [%(filename)s.%(funcName)s] %(message)s"
+    logging.basicConfig(format=log_format, level=logging.INFO)
+
+    result = run(args.repeat, args.workers, args.rounds, args.quick)
+
+    for stage, values in result["stages"].items():
+        logger.info("%-22s %s", stage, values)
+    logger.info("Изображений в секунду: %s", result["images_per_second"])
+    logger.info("Память: %s", result["memory"])
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime(r"%Y%m%d-%H%M%S")
+        output = Path(RESULTS_DIR, f"{result['commit']}_{stamp}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    logger.info("Результат сохранён в '%s'", output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
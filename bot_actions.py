@@ -1,17 +1,24 @@
+import html
 import logging
 from collections.abc import Sequence
 from pathlib import Path
 from subprocess import getoutput
 
-from telebot.types import InputMediaPhoto, Message, PhotoSize
+from telebot.apihelper import ApiTelegramException
+from telebot.types import File, InputMediaPhoto, Message, PhotoSize
 
+import metrics
+import profiling
+from channels import MAIN_CHANNEL, Channel
+from metrics import STAGE_SECONDS
 from my_envs import MyEnvs
 
 logger = logging.getLogger(__name__)
 
 _HELP_MESSAGE = """
 Обрезает получаемые картинки и сохраняет в очередь.
-Пересылает в канал "<a href="{c_link}">{c_name}</a>" по кнопке.
+Пересылает по кнопке в каналы (➡️ - куда сохраняются новые картинки):
+{channels}
 
 Команды:
 /queue - показать очередь
@@ -19,16 +26,31 @@ _HELP_MESSAGE = """
 /restart - перезапуск с обновлённым кодом
 /status - вывести и обновлять сообщение со статусом
 /remove_status - убрать сообщение со статусом
+/channel - каналы; /channel имя - куда сохранять новые картинки
+/crop_cache - статистика кеша линий обрезки
+/stats - задержки этапов и счётчики
+/profile - самые затратные функции последнего профиля
 """
 
 
 def get_help(envs: MyEnvs):
     """ справка по боту (команда /help) """
 
-    c_name = envs.BOT.get_chat(envs.CHANNEL_ID).title
-    c_link = envs.BOT.get_chat(envs.CHANNEL_ID).invite_link
+    target = get_target_channel(envs)
+    lines = []
+    for channel in envs.CHANNELS.values():
+        mark = "➡️ " if channel is target else ""
+        try:
+            chat = envs.BOT.get_chat(channel.chat_id)
+            title = html.escape(chat.title or str(channel.chat_id))
+            if chat.invite_link:
+                title = f'<a href="{chat.invite_link}">{title}</a>'
+        except ApiTelegramException as ex:
+            logger.warning("Не удалось получить канал %s: %s", channel.chat_id, ex)
+            title = str(channel.chat_id)
+        lines.append(f"{mark}{title} (<code>{channel.name}</code>)")
 
-    return _HELP_MESSAGE.format(c_name=c_name, c_link=c_link)
+    return _HELP_MESSAGE.format(channels="\n".join(lines))
 
 
 def get_version():
@@ -37,16 +59,79 @@ def get_version():
     return git_log  # нужны доп. проверки?
 
 
+def get_stats():
+    """ сводка метрик (команда /stats) """
+
+    return f"<pre>{html.escape(metrics.render_summary())}</pre>"
+
+
+def get_profile_hotspots(envs: MyEnvs):
+    """ самые затратные функции последнего профиля (команда /profile) """
+
+    path = profiling.latest_profile(envs.TEMP_DIR)
+    if path is None:
+        return "Профилей нет (см. PROFILE_EVERY, PROFILE_SLOW_SECONDS)"
+
+    return f"<pre>{html.escape(profiling.hotspots(path))}</pre>"
+
+
+def get_crop_cache_stats(envs: MyEnvs):
+    # процессы пула возвращают свои счётчики с результатами, здесь - общие
+    cache = envs.CROP_POOL.geometry_cache
+    if cache is None:
+        return "Кеш линий обрезки отключен"
+
+    stats = cache.stats()
+    total = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / total * 100 if total else 0
+    return (
+        f"Кеш линий обрезки: разрешений {stats['size']}\n"
+        f"Попаданий: {stats['hits']}, промахов: {stats['misses']} ({hit_rate:.0f}% попаданий)"
+    )
+
+
 def pull_repo():
     pull_cmd = "git pull --rebase"
     return getoutput(pull_cmd)
 
 
-def get_queue_count(envs: MyEnvs):
-    return len(list(envs.QUEUE_DIR.glob(envs.IMAGES_GLOB_PATTERN)))
+def get_queue_count(envs: MyEnvs, channel: Channel | None = None):
+    """ Размер очереди канала (без канала - всех очередей). """
+
+    if channel is not None:
+        return channel.queue_index.count()
+    return sum(ch.queue_index.count() for ch in envs.CHANNELS.values())
+
+
+def get_target_channel(envs: MyEnvs) -> Channel:
+    """ Канал, в очередь которого сохраняются новые изображения (см. `/channel`). """
+
+    return envs.CHANNELS.get(envs.STATE.state_target_channel) or envs.CHANNELS[MAIN_CHANNEL]
 
 
-def get_queue_images(envs: MyEnvs, count=10, with_caption=False, delete=False) -> Sequence[InputMediaPhoto]:
+def get_channels(envs: MyEnvs) -> str:
+    target = get_target_channel(envs)
+    lines = ["Каналы (очередь, осталось сегодня, окно):"]
+    for channel in envs.CHANNELS.values():
+        mark = "➡️ " if channel is target else ""
+        lines.append(
+            f"{mark}<code>{channel.name}</code>: {channel.queue_index.count()}, "
+            f"{channel.budget}, {'-'.join(channel.window)}"
+        )
+    lines.append("Сменить канал для новых картинок: /channel имя")
+    return "\n".join(lines)
+
+
+def set_target_channel(envs: MyEnvs, name: str) -> str:
+    if name not in envs.CHANNELS:
+        return f"Нет канала '{html.escape(name)}'.\n{get_channels(envs)}"
+    envs.STATE.state_target_channel = name
+    return f"Новые картинки сохраняются в очередь канала <code>{name}</code>"
+
+
+def get_queue_images(
+    envs: MyEnvs, channel: Channel, count=10, with_caption=False, delete=False
+) -> Sequence[InputMediaPhoto]:
     """ Возвращает указанное количество изображений из очереди,
     отсортированной по дате изменения.
      Не более 10 за раз. """
@@ -55,19 +140,25 @@ def get_queue_images(envs: MyEnvs, count=10, with_caption=False, delete=False) -
     number_to_display = min(count, 10)
 
     result = []
-    queue_files = list(envs.QUEUE_DIR.glob(envs.IMAGES_GLOB_PATTERN))
-    queue_files.sort(key=lambda x: x.stat().st_mtime_ns)
+    total = channel.queue_index.count()
+    queue_files = channel.queue_index.oldest(number_to_display)
 
-    msg = [f"Всего изображений в очереди: {len(queue_files)}"]
+    msg = [f"Всего изображений в очереди: {total}"]
+    if len(envs.CHANNELS) > 1:
+        msg[0] += f" (канал {channel.name})"
 
-    if len(queue_files) > number_to_display:
-        queue_files = queue_files[:number_to_display]
+    if total > number_to_display:
         msg.append(f"Вот первые {number_to_display}")
     for file in queue_files:
-        with open(file, 'rb') as photo:
-            result.append(InputMediaPhoto(photo.read()))
-            if delete:
-                file.unlink()
+        try:
+            with open(file, 'rb') as photo:
+                result.append(InputMediaPhoto(photo.read()))
+        except FileNotFoundError:  # удалён извне, watchdog ещё не сообщил
+            channel.queue_index.discard(file)
+            continue
+        if delete:
+            file.unlink()
+            channel.queue_index.discard(file)
 
     if result and with_caption:
         result[0].caption = '\n'.join(msg)
@@ -75,6 +166,68 @@ def get_queue_images(envs: MyEnvs, count=10, with_caption=False, delete=False) -
     return result
 
 
+def claim_queue_images(channel: Channel, count: int, sender: str) -> list[Path]:
+    """ Забирает из очереди канала до `count` самых старых файлов для отправки.
+
+    Файлы атомарно переносятся в папку отправителя в `channel.inflight_dir`,
+    так что параллельные отправители не получат один и тот же файл.
+    После отправки их нужно передать в `commit_claimed` или `release_claimed`. """
+
+    sender_dir = Path(channel.inflight_dir, sender)
+    sender_dir.mkdir(parents=True, exist_ok=True)
+
+    claimed: list[Path] = []
+    while len(claimed) < count:
+        candidates = channel.queue_index.oldest(count - len(claimed))
+        if not candidates:
+            break
+        for file in candidates:
+            target = Path(sender_dir, file.name)
+            try:
+                file.rename(target)  # атомарно: файл достанется только одному отправителю
+                claimed.append(target)
+            except FileNotFoundError:
+                pass  # забрал другой отправитель или удалён извне
+            channel.queue_index.discard(file)
+
+    return claimed
+
+
+def commit_claimed(claimed: Sequence[Path]):
+    """ Удаляет отправленные файлы (Telegram подтвердил отправку). """
+
+    for file in claimed:
+        file.unlink(missing_ok=True)
+
+
+def release_claimed(channel: Channel, claimed: Sequence[Path]):
+    """ Возвращает неотправленные файлы в очередь (время изменения, а с ним и место
+    в очереди, сохраняется). """
+
+    for file in claimed:
+        queue_path = Path(channel.queue_dir, file.name)
+        try:
+            file.rename(queue_path)
+        except FileNotFoundError:
+            continue
+        channel.queue_index.add(queue_path)
+
+
+def recover_inflight(envs: MyEnvs):
+    """ Возвращает в очередь файлы, оставшиеся "в полёте" после аварийной остановки.
+
+    Если отправка успела пройти, а удаление - нет, пост может повториться. """
+
+    for channel in envs.CHANNELS.values():
+        pattern = f"*/{envs.IMAGES_GLOB_PATTERN}"
+        leftovers = [f for f in channel.inflight_dir.glob(pattern) if f.is_file()]
+        if leftovers:
+            logger.warning(
+                "Возвращаем в очередь '%s' неотправленные файлы: %d", channel.name, len(leftovers)
+            )
+            release_claimed(channel, leftovers)
+
+
 def remove_status_message(envs: MyEnvs):
     message_id = envs.STATE.state_status_message_id
     if not message_id:
@@ -105,21 +258,52 @@ def delete_next_pin_message(message: Message, envs: MyEnvs):
     envs.BOT.clear_step_handler_by_chat_id(envs.ADMIN_USER_ID)
 
 
-def save_biggest_image(envs: MyEnvs, sizes: list[PhotoSize] | None):
-    """ Сохраняет самый большой файл и возвращает путь к созданному. """
-
+def _get_biggest_file_info(envs: MyEnvs, sizes: list[PhotoSize] | None) -> File:
     assert sizes
     # по идее не может быть сообщения с фотками и пустым массивом, но...
 
     biggest = max(sizes, key=lambda x: x.file_size)
 
-    file_info = envs.BOT.get_file(biggest.file_id)
+    with STAGE_SECONDS.time(stage="get_file"):
+        return envs.BOT.get_file(biggest.file_id)
+
+
+def save_biggest_image(envs: MyEnvs, sizes: list[PhotoSize] | None):
+    """ Сохраняет самый большой файл и возвращает путь к созданному. """
+
+    file_info = _get_biggest_file_info(envs, sizes)
     suffix = Path(file_info.file_path).suffix
     new_path = Path(f"{envs.UPLOADED_DIR}/{file_info.file_unique_id}{suffix}")
     if not new_path.exists():  # предполагаем, что id таки уникальный
-        downloaded_file = envs.BOT.download_file(file_info.file_path)
-
-        with open(new_path, "wb") as new_file:
-            new_file.write(downloaded_file)
+        with STAGE_SECONDS.time(stage="download"):
+            envs.DOWNLOADER.download_to_file(file_info.file_path, new_path)
 
     return new_path.as_posix()
+
+
+def download_biggest_image(
+    envs: MyEnvs, channel: Channel, sizes: list[PhotoSize] | None
+) -> tuple[str, bytes]:
+    """ Скачивает самый большой файл в память, без записи на диск.
+
+    Возвращает имя файла (уникальное) и содержимое.
+    Если файл с таким именем уже есть в очереди канала - содержимое пустое. """
+
+    file_info = _get_biggest_file_info(envs, sizes)
+    suffix = Path(file_info.file_path).suffix
+    file_name = f"{file_info.file_unique_id}{suffix}"
+    if Path(channel.queue_dir, file_name).exists():  # уже обработан ранее
+        return file_name, b""
+
+    with STAGE_SECONDS.time(stage="download"):
+        return file_name, envs.DOWNLOADER.download_bytes(file_info.file_path)
+
+
+def download_biggest_images(
+    envs: MyEnvs, channel: Channel, sizes_list: list[list[PhotoSize] | None]
+) -> list[tuple[str, bytes]]:
+    """ Как `download_biggest_image` для нескольких фото (альбом), параллельно. """
+
+    return envs.DOWNLOADER.map(
+        lambda sizes: download_biggest_image(envs, channel, sizes), sizes_list
+    )
@@ -0,0 +1,233 @@
+"""Массовый импорт скриншотов из папки в очередь, без бота и сети.
+
+Пример:
+    python bulk_import.py /mnt/phone/Screenshots --workers 4
+
+Обрезка идёт параллельно во всех ядрах. Результаты попадают в конец очереди
+в порядке времени изменения исходных файлов. Обработанные файлы записываются
+в журнал, поэтому прерванный импорт можно просто запустить заново.
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+
+import crop_workers
+from crop_cache import CropGeometryCache
+from my_envs import MyEnvs
+from utils.files import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = Path(MyEnvs._DATA_DIR, "bulk_import_done.txt")
+"""Журнал обработанных исходных файлов (по абсолютному пути на строку)"""
+
+
+def _import_one(
+    source: str, dest: str, mtime_ns: int, bg_crop_method: str, analysis_scale: int
+) -> str:
+    """Обрезает один файл и атомарно сохраняет в очередь (выполняется в процессе пула)"""
+
+    import image_processing as imp
+
+    source_path, dest_path = Path(source), Path(dest)
+    cropped = imp.create_cropped_image_bytes(
+        source_path.read_bytes(),
+        ext=dest_path.suffix,
+        bg_crop_method=bg_crop_method,
+        analysis_scale=analysis_scale,
+    )
+    atomic_write_bytes(dest_path, cropped)
+    os.utime(dest_path, ns=(mtime_ns, mtime_ns))
+    return source
+
+
+def _read_journal(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def _unique_dest(queue_dir: Path, name: str, taken: set[str]) -> Path:
+    """Путь в очереди для файла `name`, не занятый ни файлом в очереди, ни другим
+    исходником этого запуска (`taken`, пополняется): при совпадении к имени
+    добавляется номер (`name_1.jpg`, ...)"""
+
+    dest = Path(queue_dir, name)
+    number = 0
+    while dest.name in taken or dest.exists():
+        number += 1
+        dest = Path(queue_dir, f"{Path(name).stem}_{number}{Path(name).suffix}")
+    taken.add(dest.name)
+    return dest
+
+
+def bulk_import(
+    input_dir: Path,
+    pattern: str,
+    queue_dir: Path,
+    workers: int,
+    bg_crop_method: str = "projection",
+    analysis_scale: int = 1,
+    journal_path: Path = JOURNAL_FILE,
+    cache_file: Path | None = MyEnvs.CROP_CACHE_FILE,
+) -> int:
+    """Обрезает все подходящие файлы из `input_dir` и кладёт их в очередь.
+
+    Файлам в очереди назначается время изменения "сейчас + порядковый номер" в порядке
+    времени изменения исходников, так что они встают в конец очереди по хронологии.
+
+    Файлы в очереди не перезаписываются: если имя уже занято (в очереди или другим
+    исходником с тем же именем из другой папки), к нему добавляется номер.
+
+    Returns:
+        int: количество обработанных в этот запуск файлов
+    """
+    queue_dir.mkdir(parents=True, exist_ok=True)
+    journal_path.parent.mkdir(parents=True, exist_ok=True)
+
+    done = _read_journal(journal_path)
+    sources = sorted(input_dir.glob(pattern), key=lambda x: x.stat().st_mtime_ns)
+    todo = [p for p in sources if p.is_file() and p.resolve().as_posix() not in done]
+    logger.info(
+        "Найдено файлов: %d, уже импортировано: %d, осталось: %d",
+        len(sources),
+        len(sources) - len(todo),
+        len(todo),
+    )
+    if not todo:
+        return 0
+
+    base_mtime_ns = time.time_ns()
+    started = time.monotonic()
+    last_report = started
+    processed = failed = renamed = 0
+    taken: set[str] = set()
+    in_flight: set[Future] = set()
+    max_in_flight = workers * 4  # не держим в памяти больше, чем нужно для загрузки пула
+    # кеш линий обрезки сохраняется здесь, процессы возвращают новые записи с результатом
+    geometry_cache = CropGeometryCache(cache_file) if cache_file else None
+
+    with (
+        crop_workers.create_process_pool(
+            workers, cache_file.as_posix() if cache_file else None
+        ) as executor,
+        open(journal_path, "a", encoding="utf-8") as journal,
+    ):
+        pending = iter(enumerate(todo))
+        while True:
+            for index, source in pending:
+                dest = _unique_dest(queue_dir, source.name, taken)
+                if dest.name != source.name:
+                    renamed += 1
+                    logger.warning(
+                        "Имя '%s' уже занято в очереди, файл сохраняется как '%s'",
+                        source.as_posix(),
+                        dest.name,
+                    )
+                mtime_ns = base_mtime_ns + index * 1000  # порядок важнее точного времени
+                in_flight.add(
+                    executor.submit(
+                        crop_workers.run_in_worker,
+                        _import_one,
+                        source.as_posix(),
+                        dest.as_posix(),
+                        mtime_ns,
+                        bg_crop_method,
+                        analysis_scale,
+                    )
+                )
+                if len(in_flight) >= max_in_flight:
+                    break
+
+            if not in_flight:
+                break
+
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                try:
+                    source_done, delta = future.result()
+                except Exception as ex:
+                    failed += 1
+                    logger.error("Ошибка обработки: %s", ex)
+                    continue
+                crop_workers.merge_worker_delta(delta, geometry_cache)
+                journal.write(Path(source_done).resolve().as_posix() + "\n")
+                processed += 1
+            journal.flush()
+
+            now = time.monotonic()
+            if now - last_report >= 2 or not in_flight:
+                last_report = now
+                speed = processed / max(now - started, 1e-6)
+                left = len(todo) - processed - failed
+                logger.info(
+                    "[%d/%d] %.1f изобр./сек, ошибок: %d, осталось ~%d сек.",
+                    processed + failed,
+                    len(todo),
+                    speed,
+                    failed,
+                    left / speed if speed else 0,
+                )
+
+    logger.info(
+        "Импорт завершён: %d файлов за %.1f сек., ошибок: %d, переименовано: %d",
+        processed,
+        time.monotonic() - started,
+        failed,
+        renamed,
+    )
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт скриншотов в очередь")
+    parser.add_argument("input_dir", type=Path, help="папка с исходными скриншотами")
+    parser.add_argument(
+        "--pattern",
+        default=MyEnvs.IMAGES_GLOB_PATTERN,
+        help="glob паттерн файлов (по-умолчанию IMAGES_GLOB_PATTERN)",
+    )
+    parser.add_argument(
+        "--queue-dir", type=Path, default=MyEnvs.QUEUE_DIR, help="папка очереди"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="количество процессов"
+    )
+    parser.add_argument(
+        "--bg-method",
+        choices=("projection", "contours"),
+        default=MyEnvs.CROP_BG_METHOD,
+        help="см. CROP_BG_METHOD",
+    )
+    parser.add_argument(
+        "--analysis-scale",
+        type=int,
+        default=MyEnvs.CROP_ANALYSIS_SCALE,
+        help="см. CROP_ANALYSIS_SCALE",
+    )
+    parser.add_argument(
+        "--journal", type=Path, default=JOURNAL_FILE, help="журнал обработанных файлов"
+    )
+    args = parser.parse_args()
+
+    log_format = "[%(asctime)s] %(levelname)s [%(filename)s.%(funcName)s] %(message)s"
+    logging.basicConfig(format=log_format, level=logging.INFO)
+
+    bulk_import(
+        args.input_dir,
+        args.pattern,
+        args.queue_dir,
+        max(args.workers, 1),
+        bg_crop_method=args.bg_method,
+        analysis_scale=args.analysis_scale,
+        journal_path=args.journal,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import logging
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+from queue_index import QueueIndex
+from utils.persist_state import State
+
+logger = logging.getLogger(__name__)
+
+MAIN_CHANNEL = "main"
+"""Канал из `CHANNEL_ID` (очередь `QUEUE_DIR`), есть всегда"""
+
+DEFAULT_WINDOW = ("12:00", "23:50")
+"""Окно публикации по умолчанию: бюджет на день выдаётся в начале и сгорает в конце"""
+
+_budget_lock = threading.Lock()
+"""Защищает бюджеты всех каналов (каналы, кроме основного, хранят их в одном словаре)"""
+
+
+class ChannelConfig(NamedTuple):
+    """Настройки дополнительного канала (см. `parse_channels`)"""
+
+    name: str
+    chat_id: int
+    per_day: int | None = None
+    """Постов в день (None - `number_of_messages_per_day` из настроек)"""
+    window: tuple[str, str] = DEFAULT_WINDOW
+
+
+def parse_channels(spec: str) -> list[ChannelConfig]:
+    """Разбирает переменную `EXTRA_CHANNELS`.
+
+    Каналы разделяются `;`, каждый: `имя=chat_id[,постов в день[,ЧЧ:ММ-ЧЧ:ММ]]`,
+    например: `art=-1001234567890,3,10:00-22:00;memes=-1009876543210`
+    """
+    configs = []
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        try:
+            name, params = (s.strip() for s in item.split("=", 1))
+            chat_id, per_day, window, *_ = [*params.split(","), "", ""]
+            start, end = window.split("-") if window else DEFAULT_WINDOW
+            config = ChannelConfig(
+                name, int(chat_id), int(per_day) if per_day else None, (start, end)
+            )
+        except ValueError as ex:
+            raise ValueError(f"Не удалось разобрать канал '{item}' в EXTRA_CHANNELS") from ex
+        if not name.isidentifier() or name == MAIN_CHANNEL:
+            raise ValueError(f"Недопустимое имя канала '{name}' в EXTRA_CHANNELS")
+        configs.append(config)
+    return configs
+
+
+class Channel:
+    """Канал для публикации: своя очередь (папка и индекс), папка "в полёте",
+    дневной бюджет постов и окно публикации.
+
+    Бюджет хранится в `State`: у основного канала - в `state_number_of_messages_to_send`
+    (как и раньше), у остальных - в `state_channel_budgets`.
+    """
+
+    def __init__(
+        self,
+        config: ChannelConfig,
+        queue_dir: str | Path,
+        inflight_dir: str | Path,
+        pattern: str,
+        state: State,
+    ) -> None:
+        """
+        Args:
+            config (ChannelConfig): имя, чат, бюджет и окно
+            queue_dir (str | Path): папка очереди основного канала (`QUEUE_DIR`),
+                у остальных - рядом с суффиксом имени (`queue_art`)
+            inflight_dir (str | Path): то же для файлов на время отправки (`INFLIGHT_DIR`)
+            pattern (str): glob паттерн файлов очереди (`IMAGES_GLOB_PATTERN`)
+            state (State): настройки и состояние (бюджет)
+        """
+        self.name = config.name
+        self.chat_id = config.chat_id
+        self.window = config.window
+        self.queue_dir = _channel_dir(Path(queue_dir), config.name)
+        self.inflight_dir = _channel_dir(Path(inflight_dir), config.name)
+        self._per_day = config.per_day
+        self._state = state
+
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        self.inflight_dir.mkdir(parents=True, exist_ok=True)
+        self.queue_index = QueueIndex(self.queue_dir, pattern)
+
+    def __repr__(self) -> str:
+        return f"Channel({self.name!r}, {self.chat_id})"
+
+    # region бюджет
+
+    @property
+    def per_day(self) -> int:
+        if self._per_day is not None:
+            return self._per_day
+        return self._state.number_of_messages_per_day or 0
+
+    @property
+    def budget(self) -> int:
+        """Сколько постов осталось отправить сегодня"""
+
+        if self.name == MAIN_CHANNEL:
+            return self._state.state_number_of_messages_to_send
+        return (self._state.state_channel_budgets or {}).get(self.name, 0)
+
+    def _set_budget(self, value: int):
+        if self.name == MAIN_CHANNEL:
+            self._state.state_number_of_messages_to_send = value
+        else:
+            self._state.state_channel_budgets = {
+                **(self._state.state_channel_budgets or {}),
+                self.name: value,
+            }
+
+    def take_from_budget(self) -> bool:
+        """Резервирует одну отправку из бюджета"""
+
+        with _budget_lock:
+            if not (budget := self.budget):
+                return False
+            self._set_budget(budget - 1)
+            return True
+
+    def return_to_budget(self):
+        with _budget_lock:
+            self._set_budget(self.budget + 1)
+
+    def add_daily_budget(self):
+        """Начало окна: добавляет дневной бюджет к остатку"""
+
+        with _budget_lock:
+            budget = self.budget + self.per_day
+            self._set_budget(budget)
+        logger.info("Канал '%s': бюджет на сегодня %s", self.name, budget)
+
+    def clear_budget(self):
+        """Конец окна: неотправленное не копится"""
+
+        with _budget_lock:
+            self._set_budget(0)
+        logger.info("Канал '%s': бюджет обнулён", self.name)
+
+    # endregion
+
+    def can_send(self) -> bool:
+        return bool(self.budget) and self.queue_index.count() > 0
+
+
+def _channel_dir(main_dir: Path, name: str) -> Path:
+    return main_dir if name == MAIN_CHANNEL else main_dir.with_name(f"{main_dir.name}_{name}")
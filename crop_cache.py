@@ -0,0 +1,154 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+
+from utils.files import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class CropGeometry(NamedTuple):
+    """Найденные линии обрезки в координатах исходного изображения"""
+
+    kept_height: int
+    """Высота, которая остаётся после обрезки навигационной панели"""
+
+    content: tuple[int, int, int, int] | None
+    """x, y, w, h - рамка содержимого без чёрного фона (None - не искали или не нашли)"""
+
+
+class CropGeometryCache:
+    """Постоянный LRU-кеш линий обрезки по разрешению изображения (ключ `ШxВ`).
+
+    Скриншоты приходят с нескольких телефонов, у каждого высота нав.панели и чёрные
+    поля постоянны. Поэтому для известного разрешения сначала дёшево проверяется,
+    что сохранённые линии подходят, и полный анализ нужен только при промахе
+    (проверка - в `image_processing`, здесь только хранение, без cv2).
+
+    Файл перезаписывается только при изменении содержимого (не при попадании).
+
+    Без `autosave` (в процессах-обработчиках пула) файл не пишется: счётчики и новые
+    записи забирает `take_delta`, а сохраняет основной процесс через `merge_delta`,
+    иначе процессы перезаписывали бы записи друг друга.
+    """
+
+    def __init__(self, path: str | Path, max_size: int = 16, autosave: bool = True) -> None:
+        """
+        Args:
+            path (str | Path): файл для хранения кеша (JSON)
+            max_size (int, optional): максимальное количество разрешений в кеше
+            autosave (bool, optional): сохранять файл при изменении (см. описание класса)
+        """
+        self._path = Path(path)
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        self._max_size = max_size
+        self._autosave = autosave
+        self._items: OrderedDict[str, CropGeometry] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self._delta: dict = self._empty_delta()
+
+        self._load()
+
+    @staticmethod
+    def _empty_delta() -> dict:
+        return {"hits": 0, "misses": 0, "used": [], "items": {}}
+
+    def _load(self):
+        if not self._path.exists() or self._path.stat().st_size == 0:
+            return
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            for key, (kept_height, content) in raw.items():
+                self._items[key] = CropGeometry(kept_height, tuple(content) if content else None)
+        except Exception as ex:
+            logger.warning("Не удалось прочитать кеш обрезки '%s': %s", self._path, ex)
+            self._items.clear()
+
+    def _save(self):
+        data = {k: [v.kept_height, v.content] for k, v in self._items.items()}
+        try:
+            atomic_write_bytes(self._path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        except Exception as ex:
+            logger.warning("Не удалось сохранить кеш обрезки '%s': %s", self._path, ex)
+
+    def get(self, key: str) -> CropGeometry | None:
+        """Сохранённые линии обрезки для разрешения (без проверки и без счётчиков)"""
+
+        with self._lock:
+            geometry = self._items.get(key)
+            if geometry is not None:
+                self._items.move_to_end(key)
+            return geometry
+
+    def record(self, key: str, hit: bool):
+        """Учитывает попадание (линии подошли) или промах"""
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if self._autosave:
+                return
+            if hit:
+                self._delta["hits"] += 1
+                self._delta["used"].append(key)
+            else:
+                self._delta["misses"] += 1
+
+    def put(self, key: str, geometry: CropGeometry):
+        """Сохраняет линии обрезки для разрешения"""
+
+        with self._lock:
+            if not self._put(key, geometry):
+                return
+            if self._autosave:
+                self._save()
+            else:
+                self._delta["items"][key] = geometry
+
+    def _put(self, key: str, geometry: CropGeometry) -> bool:
+        if self._items.get(key) == geometry:
+            self._items.move_to_end(key)
+            return False
+
+        self._items[key] = geometry
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+        return True
+
+    def take_delta(self) -> dict:
+        """Забирает счётчики и новые записи с прошлого вызова (для `merge_delta`)"""
+
+        with self._lock:
+            delta, self._delta = self._delta, self._empty_delta()
+        return delta
+
+    def merge_delta(self, delta: dict):
+        """Добавляет счётчики и записи из `take_delta` другого процесса и сохраняет файл"""
+
+        with self._lock:
+            self.hits += delta["hits"]
+            self.misses += delta["misses"]
+            for key in delta["used"]:
+                if key in self._items:
+                    self._items.move_to_end(key)
+            changed = False
+            for key, geometry in delta["items"].items():
+                changed = self._put(key, CropGeometry(*geometry)) or changed
+            if changed:
+                self._save()
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики попаданий/промахов и размер кеша"""
+
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
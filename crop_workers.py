@@ -0,0 +1,313 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from types import ModuleType
+
+import metrics
+import profiling
+from crop_cache import CropGeometryCache
+from resource_governor import ResourceGovernor, log_peak_rss
+from utils.debug_writer import DebugRetention, DebugWriter
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(RuntimeError):
+    """Все места в очереди обработки заняты"""
+
+
+_worker_cache: CropGeometryCache | None = None
+"""Кеш линий обрезки процесса-обработчика (файл сохраняет основной процесс)"""
+
+
+def _init_worker(
+    cache_file: str | None,
+    profile_config: profiling.ProfileConfig | None,
+    debug_retention: DebugRetention | None,
+):
+    """Инициализация процесса-обработчика: свой кеш линий обрезки (загружается из общего
+    файла, новые записи уходят в основной процесс, см. `run_in_worker`),
+    настройки профилирования и фоновая запись отладочных изображений"""
+
+    global _worker_cache
+    _worker_cache = CropGeometryCache(cache_file, autosave=False) if cache_file else None
+    _load_image_processing(_worker_cache, debug_retention)
+    metrics.take_delta()  # при fork значения основного процесса копируются - сбрасываем
+    profiling.configure(profile_config)
+
+
+def create_process_pool(
+    max_workers: int,
+    cache_file: str | None = None,
+    profile_config: profiling.ProfileConfig | None = None,
+    debug_retention: DebugRetention | None = None,
+) -> ProcessPoolExecutor:
+    """Пул процессов-обработчиков с настроенным `image_processing` (для `CropWorkers`
+    и `bulk_import.py`)
+
+    Args:
+        max_workers (int): количество процессов
+        cache_file (str | None, optional): файл кеша линий обрезки
+        profile_config (ProfileConfig | None, optional): профилирование в процессах
+        debug_retention (DebugRetention | None, optional): фоновая запись отладочных
+            изображений (None - запись сразу)
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(cache_file, profile_config, debug_retention),
+    )
+
+
+def _load_image_processing(
+    geometry_cache: CropGeometryCache | None, debug_retention: DebugRetention | None
+) -> ModuleType:
+    """Импортирует и настраивает `image_processing` (вместе с ним - cv2 и numpy)"""
+
+    import image_processing as imp
+
+    imp.geometry_cache = geometry_cache
+    imp.debug_writer = DebugWriter(debug_retention) if debug_retention else None
+    return imp
+
+
+def run_in_worker(fn: Callable, *args) -> tuple:
+    """Выполняет задачу в процессе-обработчике и возвращает результат вместе
+    с приростом метрик и кеша линий обрезки процесса (для `merge_worker_delta`)"""
+
+    result = fn(*args)
+    cache_delta = _worker_cache.take_delta() if _worker_cache is not None else None
+    return result, {"metrics": metrics.take_delta(), "crop_cache": cache_delta}
+
+
+def merge_worker_delta(delta: dict, geometry_cache: CropGeometryCache | None):
+    """Переносит в основной процесс метрики и кеш из `run_in_worker`
+    (кеш сохраняется в файл здесь)"""
+
+    metrics.merge_delta(delta["metrics"])
+    if geometry_cache is not None and delta["crop_cache"]:
+        geometry_cache.merge_delta(delta["crop_cache"])
+
+
+def crop_bytes(
+    data: bytes, ext: str, debug_path: str | None, bg_crop_method: str, analysis_scale: int
+) -> bytes:
+    """Обрезка одного изображения в процессе-обработчике"""
+
+    import image_processing as imp
+
+    with log_peak_rss("изображение"), profiling.profiled("crop"):
+        return imp.create_cropped_image_bytes(
+            data,
+            ext=ext,
+            debug_path=debug_path,
+            bg_crop_method=bg_crop_method,
+            analysis_scale=analysis_scale,
+        )
+
+
+def crop_bytes_batch(
+    items: list[tuple[bytes, str]],
+    debug_paths: list[str | None],
+    bg_crop_method: str,
+    analysis_scale: int,
+) -> list[bytes]:
+    """Пакетная обрезка (альбом) в процессе-обработчике"""
+
+    import image_processing as imp
+
+    with log_peak_rss(f"альбом из {len(items)}"), profiling.profiled("crop_batch"):
+        return imp.create_cropped_images_bytes(
+            items,
+            debug_paths=debug_paths,
+            bg_crop_method=bg_crop_method,
+            analysis_scale=analysis_scale,
+        )
+
+
+class CropWorkers:
+    """Пул процессов для обрезки изображений, чтобы не занимать поток бота.
+
+    Количество задач (выполняемых и ожидающих) ограничено `max_pending`:
+    если мест нет дольше `wait_seconds` - `submit` выбрасывает `PoolSaturatedError`.
+
+    При `max_workers` = 0 задачи выполняются сразу в вызывающем потоке (как раньше).
+
+    С `governor` задача уходит в процесс, только когда её допускает `ResourceGovernor`
+    (хватает памяти), до этого она ждёт в очереди пула, не блокируя вызывающего.
+
+    Результат задачи из процесса отдаётся (и колбэки `Future` выполняются) в потоках
+    `completion_threads`, а не в служебном потоке `ProcessPoolExecutor`: запись в очередь
+    и запросы к Telegram из колбэков не задерживают получение других результатов.
+
+    Тяжёлые модули (cv2, numpy) не загружаются при создании пула: процессы
+    запускаются при первой задаче, а в основном процессе модуль загружает
+    `image_processing()` при первом обращении.
+
+    Кеш линий обрезки (`geometry_cache`) хранит и сохраняет основной процесс:
+    процессы получают его из файла при запуске, а счётчики и новые записи
+    возвращают вместе с результатами.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_pending: int = 20,
+        wait_seconds: float = 30,
+        cache_file: str | Path | None = None,
+        profile_config: profiling.ProfileConfig | None = None,
+        debug_retention: DebugRetention | None = None,
+        governor: ResourceGovernor | None = None,
+        completion_threads: int = 2,
+    ) -> None:
+        """
+        Args:
+            max_workers (int, optional): количество процессов (0 - без пула)
+            max_pending (int, optional): максимум задач в работе и в ожидании
+            wait_seconds (float, optional): сколько ждать свободного места
+            cache_file (str | Path | None, optional): файл кеша линий обрезки
+            profile_config (ProfileConfig | None, optional): профилирование в процессах
+            debug_retention (DebugRetention | None, optional): фоновая запись отладочных
+                изображений в процессах (None - запись сразу)
+            governor (ResourceGovernor | None, optional): допуск задач к обработке по памяти
+            completion_threads (int, optional): потоков для обработки готовых результатов
+        """
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, 1)
+        self._wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+        self._cache_file = Path(cache_file).as_posix() if cache_file else None
+        self.geometry_cache = CropGeometryCache(cache_file) if cache_file else None
+        self._debug_retention = debug_retention
+        self._imp: ModuleType | None = None
+        self._imp_lock = threading.Lock()
+        self._governor = governor
+        self._admission: queue.Queue = queue.Queue()
+        self._completions: ThreadPoolExecutor | None = None
+
+        if max_workers > 0:
+            self._executor = create_process_pool(
+                max_workers, self._cache_file, profile_config, debug_retention
+            )
+            self._completions = ThreadPoolExecutor(
+                max(completion_threads, 1), thread_name_prefix="crop_done"
+            )
+            logger.info(
+                "Запущен пул обработки: процессов %s, очередь до %s", max_workers, max_pending
+            )
+            if governor is not None:
+                threading.Thread(target=self._admit_loop, daemon=True).start()
+
+    def image_processing(self) -> ModuleType:
+        """Настроенный модуль `image_processing` для обработки в этом процессе
+        (загружается при первом вызове)"""
+
+        with self._imp_lock:
+            if self._imp is None:
+                started = time.perf_counter()
+                self._imp = _load_image_processing(self.geometry_cache, self._debug_retention)
+                logger.info(
+                    "Модули обработки изображений загружены за %.2f сек.",
+                    time.perf_counter() - started,
+                )
+            return self._imp
+
+    def submit(self, fn: Callable, *args, weight: int = 1) -> Future:
+        """Отправляет задачу в пул, ожидая свободного места (см. описание класса).
+
+        `weight` - сколько изображений в задаче (для `governor`)"""
+
+        if not self._slots.acquire(timeout=self._wait_seconds):
+            raise PoolSaturatedError(
+                f"Очередь обработки заполнена ({self.max_pending}), попробуйте позже"
+            )
+
+        try:
+            future: Future = Future()
+            if self._executor is None:
+                self.image_processing()  # задача выполнится здесь - нужен настроенный модуль
+                with self.admission(weight):
+                    try:
+                        future.set_result(fn(*args))
+                    except Exception as ex:
+                        future.set_exception(ex)
+            elif self._governor is not None:
+                self._admission.put((future, fn, args, weight))  # см. `_admit_loop`
+            else:
+                self._executor.submit(run_in_worker, fn, *args).add_done_callback(
+                    lambda inner: self._complete(inner, future)
+                )
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @contextmanager
+    def admission(self, weight: int = 1) -> Iterator[None]:
+        """Блок обработки изображений в текущем процессе: ждёт допуска `governor`"""
+
+        if self._governor is None:
+            yield
+            return
+
+        self._governor.acquire(weight)
+        try:
+            yield
+        finally:
+            self._governor.release(weight)
+
+    def _admit_loop(self):
+        """Передаёт задачи в процессы по мере допуска `governor` (по одной, по порядку)"""
+
+        assert self._governor is not None and self._executor is not None
+        while True:
+            future, fn, args, weight = self._admission.get()
+            self._governor.acquire(weight)
+            try:
+                inner = self._executor.submit(run_in_worker, fn, *args)
+            except BaseException as ex:
+                self._governor.release(weight)
+                future.set_exception(ex)
+                continue
+
+            def on_done(inner: Future, future=future, weight=weight):
+                self._governor.release(weight)
+                self._complete(inner, future)
+
+            inner.add_done_callback(on_done)
+
+    def _complete(self, inner: Future, outer: Future):
+        """Колбэк в служебном потоке пула процессов: только передаёт результат
+        в `_completions` (см. описание класса)"""
+
+        assert self._completions is not None
+        try:
+            self._completions.submit(self._unwrap_result, inner, outer)
+        except RuntimeError:  # пул остановлен - отдаём результат здесь
+            self._unwrap_result(inner, outer)
+
+    def _unwrap_result(self, inner: Future, outer: Future):
+        """Переносит метрики и кеш процесса-обработчика в основной процесс и отдаёт результат"""
+
+        try:
+            result, delta = inner.result()
+        except BaseException as ex:
+            outer.set_exception(ex)
+            return
+        merge_worker_delta(delta, self.geometry_cache)
+        outer.set_result(result)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        if self._completions is not None:
+            self._completions.shutdown(wait=wait)
+
@@ -0,0 +1,153 @@
+import io
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+
+from metrics import DOWNLOAD_RETRIES_TOTAL
+from utils.files import atomic_writer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_FILE_URL = "https://api.telegram.org/file/bot{0}/{1}"
+
+_RETRY_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class DownloadError(RuntimeError):
+    """Файл не удалось скачать (ответ не 200/206 или закончились попытки)"""
+
+
+class FileDownloader:
+    """Скачивание файлов Telegram по частям через общую сессию (keep-alive).
+
+    * соединения переиспользуются (пул на `max_parallel` соединений), TLS не повторяется;
+    * одновременно идёт не больше `max_parallel` загрузок (из любых потоков);
+    * файл читается кусками по `chunk_size` и сразу пишется в файл или буфер;
+    * оборванная загрузка продолжается с места обрыва (заголовок `Range`),
+      если сервер его не поддерживает - начинается заново.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        max_parallel: int = 4,
+        chunk_size: int = 64 * 2**10,
+        retries: int = 3,
+        timeout: tuple[float, float] = (5, 60),
+    ) -> None:
+        """
+        Args:
+            token (str): токен бота (часть адреса файла)
+            max_parallel (int, optional): максимум одновременных загрузок
+            chunk_size (int, optional): размер куска чтения в байтах
+            retries (int, optional): повторов после обрыва или ошибки сервера
+            timeout (tuple[float, float], optional): таймауты соединения и чтения куска
+        """
+        self.max_parallel = max(max_parallel, 1)
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self._token = token
+        self._slots = threading.BoundedSemaphore(self.max_parallel)
+        self._executor = ThreadPoolExecutor(self.max_parallel, thread_name_prefix="download")
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_parallel)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def url(self, file_path: str) -> str:
+        """Адрес файла (учитывает `apihelper.FILE_URL`, как `TeleBot.download_file`)"""
+
+        return (apihelper.FILE_URL or DEFAULT_FILE_URL).format(self._token, file_path)
+
+    def download_bytes(self, file_path: str) -> bytes:
+        """Скачивает файл в память (куски пишутся сразу в общий буфер)"""
+
+        buffer = io.BytesIO()
+        self._download(file_path, buffer)
+        return buffer.getvalue()
+
+    def download_to_file(self, file_path: str, dest: str | Path):
+        """Скачивает файл на диск (атомарно: через временный файл рядом)"""
+
+        with atomic_writer(dest) as f:
+            self._download(file_path, f)
+
+    def submit(self, fn: Callable[..., R], *args) -> "Future[R]":
+        """Выполняет `fn` (обычно с загрузкой внутри) в потоке загрузок, не ожидая.
+
+        Потоков столько же, сколько одновременных загрузок: если `fn` ждёт чего-то
+        ещё (места в пуле обрезки), новые задачи ждут вместе с ним."""
+
+        return self._executor.submit(fn, *args)
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> list[R]:
+        """Выполняет `fn` (обычно с загрузкой внутри) для всех `items` параллельно,
+        результаты - в том же порядке"""
+
+        return list(self._executor.map(fn, items))
+
+    def _download(self, file_path: str, out: BinaryIO):
+        url = self.url(file_path)
+        written = 0
+        attempt = 0
+        with self._slots:
+            while True:
+                headers = {"Range": f"bytes={written}-"} if written else {}
+                try:
+                    with self._session.get(
+                        url, headers=headers, stream=True, timeout=self.timeout
+                    ) as response:
+                        if written and response.status_code == 200:
+                            # сервер не умеет продолжать - начинаем заново
+                            out.seek(0)
+                            out.truncate()
+                            written = 0
+                        elif response.status_code not in (200, 206):
+                            if response.status_code < 500 or attempt >= self.retries:
+                                raise DownloadError(
+                                    f"Не удалось скачать '{file_path}': "
+                                    f"HTTP {response.status_code} {response.reason}"
+                                )
+                            raise requests.ConnectionError(f"HTTP {response.status_code}")
+
+                        for chunk in response.iter_content(self.chunk_size):
+                            out.write(chunk)
+                            written += len(chunk)
+                        return
+
+                except _RETRY_EXCEPTIONS as ex:
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise DownloadError(
+                            f"Не удалось скачать '{file_path}' за {attempt} попыток: {ex}"
+                        ) from ex
+                    DOWNLOAD_RETRIES_TOTAL.inc()
+                    logger.warning(
+                        "Загрузка '%s' прервалась на %d байтах (попытка %d): %s",
+                        file_path,
+                        written,
+                        attempt,
+                        ex,
+                    )
+                    time.sleep(0.5 * 2 ** (attempt - 1))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
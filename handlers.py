@@ -1,51 +1,167 @@
 import logging
+import threading
+from concurrent.futures import Future
 from os.path import exists
 from time import sleep
 
 from telebot import ExceptionHandler
-from telebot.types import Message
+from telebot.types import InputMediaPhoto, Message
 
 import bot_actions
+import profiling
+from channels import Channel
+from metrics import IMAGES_TOTAL, STAGE_SECONDS
 from my_envs import MyEnvs
-from queue_processor import process_one_image
+from queue_processor import process_one_image, submit_image_bytes, submit_images_bytes
 
 logger = logging.getLogger(__name__)
 
+ALBUM_WAIT_SECONDS = 2.0
+"""Сколько ждать остальные сообщения альбома после первого"""
 
-def send_queue_to_channel(envs: MyEnvs, count: int):
-    """ Отправляет в канал указанное количество изображений.
-    Удаляет их из очереди! """
-
-    queue_images = bot_actions.get_queue_images(envs, count=count, delete=True)
-    imgs_cnt = len(queue_images)
-    if imgs_cnt > 1:
-        envs.BOT.send_media_group(
-            media=queue_images,  # type: ignore
-            chat_id=envs.CHANNEL_ID)
-        return f"Отправлено! {imgs_cnt}"
-    elif imgs_cnt == 1:
-        envs.BOT.send_photo(
-            photo=queue_images[0].media,
-            chat_id=envs.CHANNEL_ID,
-            timeout=envs.STATE.read_timeout * 2,  # фотки могут долго грузиться (х2)
-        )
-        return f"Отправлено! {imgs_cnt}"
-    else:
+_albums: dict[str, list[Message]] = {}
+_albums_lock = threading.Lock()
+
+
+def _add_to_album(message: Message, envs: MyEnvs, channel: Channel):
+    """Копит сообщения альбома (одинаковый `media_group_id`), по первому
+    запускает таймер, после которого альбом обрабатывается целиком
+    (в очередь канала, выбранного на момент первого сообщения)."""
+
+    with _albums_lock:
+        messages = _albums.setdefault(message.media_group_id, [])
+        messages.append(message)
+        if len(messages) == 1:
+            timer = threading.Timer(
+                ALBUM_WAIT_SECONDS,
+                _process_album,
+                args=(message.media_group_id, envs, channel),
+            )
+            timer.daemon = True
+            timer.start()
+
+
+def _process_album(media_group_id: str, envs: MyEnvs, channel: Channel):
+    with _albums_lock:
+        messages = _albums.pop(media_group_id, [])
+
+    def on_processed(future: Future):
+        try:
+            for message, processed_path in zip(messages, future.result()):
+                if exists(processed_path):
+                    envs.BOT.delete_message(message.from_user.id, message.message_id)
+            logger.info("Получили и успешно сохранили альбом из %d картинок", len(messages))
+
+        except Exception as ex:
+            _report_error(envs, "Не смог обработать альбом 😔", ex)
+
+    try:
+        with profiling.profiled("download"):
+            downloaded = bot_actions.download_biggest_images(
+                envs, channel, [m.photo for m in messages]
+            )
+            submit_images_bytes(downloaded, envs, channel).add_done_callback(on_processed)
+
+    except Exception as ex:
+        _report_error(envs, "Не смог обработать альбом 😔", ex)
+
+
+def _report_error(envs: MyEnvs, text: str, ex: Exception):
+    """Сообщает админу об ошибке фоновой обработки (ответить на сообщение уже некому)"""
+
+    logger.exception(text, exc_info=ex)
+    IMAGES_TOTAL.inc(result="error")
+    try:
+        envs.BOT.send_message(envs.ADMIN_USER_ID, f"{text}\n{ex}")
+    except Exception as send_ex:
+        logger.exception("Не удалось сообщить об ошибке:", exc_info=send_ex)
+
+
+def _on_image_processed(future: Future, message: Message, envs: MyEnvs):
+    try:
+        if exists(future.result()):
+            if envs.BOT.delete_message(message.from_user.id, message.message_id):
+                logger.info("Получили и успешно сохранили картинку")
+
+    except Exception as ex:
+        _report_error(envs, "Не смог обработать картинку 😔", ex)
+
+
+def _download_and_submit(message: Message, envs: MyEnvs, channel: Channel):
+    """Скачивает фото и отправляет в пул обрезки (выполняется в потоке загрузок)"""
+
+    try:
+        with profiling.profiled("download"):
+            file_name, data = bot_actions.download_biggest_image(envs, channel, message.photo)
+            submit_image_bytes(file_name, data, envs, channel).add_done_callback(
+                lambda future: _on_image_processed(future, message, envs)
+            )
+    except Exception as ex:
+        _report_error(envs, "Не смог обработать картинку 😔", ex)
+
+
+def send_queue_to_channel(envs: MyEnvs, channel: Channel, count: int, sender: str = "manual"):
+    """ Отправляет в канал указанное количество изображений из его очереди.
+    Удаляет их из очереди!
+
+    Файлы забираются атомарно (см. `claim_queue_images`), поэтому несколько
+    отправителей могут работать одновременно. Удаляются файлы только после
+    подтверждения от Telegram, при ошибке - возвращаются в очередь. """
+
+    claimed = bot_actions.claim_queue_images(
+        channel, min(count, 10), f"{sender}-{threading.get_ident()}"
+    )
+    if not claimed:
         return "В очереди ничего нет"
 
+    try:
+        queue_images = [InputMediaPhoto(file.read_bytes()) for file in claimed]
+        imgs_cnt = len(queue_images)
+        if imgs_cnt > 1:
+            with STAGE_SECONDS.time(stage="send_media_group"):
+                envs.BOT.send_media_group(
+                    media=queue_images,  # type: ignore
+                    chat_id=channel.chat_id)
+        else:
+            with STAGE_SECONDS.time(stage="send_photo"):
+                envs.BOT.send_photo(
+                    photo=queue_images[0].media,
+                    chat_id=channel.chat_id,
+                    timeout=envs.STATE.read_timeout * 2,  # фотки могут долго грузиться (х2)
+                )
+    except BaseException:
+        bot_actions.release_claimed(channel, claimed)
+        raise
+
+    bot_actions.commit_claimed(claimed)
+    return f"Отправлено! {imgs_cnt}"
+
 
 def process_message(message: Message, envs: MyEnvs):
     chat_id = message.from_user.id
 
     if message.content_type == 'photo':
-        src_path = bot_actions.save_biggest_image(envs, message.photo)
-        processed_path = process_one_image(src_path, envs)
-        if exists(processed_path):
-            # add telebot.apihelper.ApiTelegramException
-            if envs.BOT.delete_message(chat_id, message.message_id):
-                logger.info("Получили и успешно сохранили картинку")
+        channel = bot_actions.get_target_channel(envs)
+        if envs.SAVE_UPLOADED:  # оригинал сохраняется на диск (для отладки)
+            src_path = bot_actions.save_biggest_image(envs, message.photo)
+            processed_path = process_one_image(src_path, envs, channel)
+            if exists(processed_path):
+                # add telebot.apihelper.ApiTelegramException
+                if envs.BOT.delete_message(chat_id, message.message_id):
+                    logger.info("Получили и успешно сохранили картинку")
+            return
+
+        if message.media_group_id:
+            # альбом обрабатывается целиком, когда придут все сообщения
+            _add_to_album(message, envs, channel)
+            return
+
+        # скачивание и обрезка идут в фоне, поток бота свободен для следующих сообщений,
+        # исходное сообщение удаляется, когда результат готов
+        envs.DOWNLOADER.submit(_download_and_submit, message, envs, channel)
     else:
-        match isinstance(message.text, str) and message.text.lower():
+        command, *args = (message.text or "").split() or [""]
+        match isinstance(message.text, str) and command.lower():
             case "/help":
                 return bot_actions.get_help(envs)
 
@@ -62,6 +178,7 @@ def process_message(message: Message, envs: MyEnvs):
 
             case "/queue":
                 queue_images = bot_actions.get_queue_images(envs,
+                                                            bot_actions.get_target_channel(envs),
                                                             with_caption=True,
                                                             delete=False)
                 if len(queue_images) > 1:
@@ -81,6 +198,20 @@ def process_message(message: Message, envs: MyEnvs):
             case "/restart":
                 return "Лог <code>git pull</code>:\n" + bot_actions.pull_repo()
 
+            case "/channel":
+                if not args:
+                    return bot_actions.get_channels(envs)
+                return bot_actions.set_target_channel(envs, args[0])
+
+            case "/crop_cache":
+                return bot_actions.get_crop_cache_stats(envs)
+
+            case "/stats":
+                return bot_actions.get_stats()
+
+            case "/profile":
+                return bot_actions.get_profile_hotspots(envs)
+
             case "/version":
                 return f"Моя версия: <code>{bot_actions.get_version()}</code>"
 
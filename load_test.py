@@ -0,0 +1,278 @@
+"""Нагрузочный тест бота на локальной замене Bot API (`utils.fake_bot_api`).
+
+Пример:
+    python load_test.py --messages 200 --ingest-threads 4 --workers 2
+    python load_test.py --messages 50 --album-size 5 --rate-limit-every 10
+
+Бот собирается так же, как в `main.py` (пул обрезки, скачивание, лимитер запросов),
+но `telebot.apihelper.API_URL` и `FILE_URL` указывают на локальный сервер,
+а данные хранятся во временной папке. Замеряется:
+* приём - от вызова `handlers.process_message` с фото до удаления исходного сообщения
+  (изображение уже в очереди);
+* отправка - вызовы `send_queue_to_channel` в несколько потоков, пока очередь не опустеет.
+
+Результат сохраняется в JSON (по-умолчанию `data/load_tests/<коммит>_<время>.json`).
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import cycle
+from pathlib import Path
+
+import telebot
+from telebot import apihelper
+from telebot.types import Message
+
+import handlers
+import metrics
+from channels import MAIN_CHANNEL, Channel, ChannelConfig
+from crop_workers import CropWorkers
+from file_downloader import FileDownloader
+from my_envs import MyEnvs
+from resource_governor import ResourceGovernor
+from telegram_limiter import TelegramRateLimiter
+from utils.fake_bot_api import FakeBotApi
+from utils.git_revision import current_commit
+from utils.persist_state import State
+from utils.synthetic_screens import encode, iter_cases
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path("data", "load_tests")
+DEFAULT_SETTINGS = Path(__file__).with_name("_default_settings.json")
+
+_TEST_ENVS = {
+    "BOT_TOKEN": "1:load-test",
+    "ADMIN_USER_ID": "1",
+    "CHANNEL_ID": "-1001",
+    "CROP_DEBUG": "-",  # обязательная переменная, ниже отладка выключается
+}
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def _summary(latencies: list[float], items: int, elapsed: float) -> dict[str, float]:
+    return {
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "per_second": round(items / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "max_ms": round(max(latencies, default=0) * 1000, 1),
+    }
+
+
+def build_envs(args: argparse.Namespace) -> MyEnvs:
+    """Окружение бота, как в `main.py`, но с запросами к локальному серверу"""
+
+    for name, value in _TEST_ENVS.items():
+        os.environ.setdefault(name, value)
+    envs = MyEnvs()
+    envs.CROP_DEBUG = False
+
+    envs.STATE = State(data_path=envs.STATE_FILE, default_json_path=DEFAULT_SETTINGS.as_posix())
+    channel = Channel(
+        ChannelConfig(MAIN_CHANNEL, envs.CHANNEL_ID),
+        envs.QUEUE_DIR,
+        envs.INFLIGHT_DIR,
+        envs.IMAGES_GLOB_PATTERN,
+        envs.STATE,
+    )
+    envs.CHANNELS = {channel.name: channel}
+
+    envs.GOVERNOR = ResourceGovernor(
+        max_rss_mb=envs.MEMORY_LIMIT_MB,
+        min_available_mb=envs.MEMORY_MIN_AVAILABLE_MB,
+        image_mb=envs.IMAGE_MEMORY_MB,
+    )
+    envs.CROP_POOL = CropWorkers(
+        max_workers=args.workers,
+        max_pending=max(args.messages, 1),
+        governor=envs.GOVERNOR,
+    )
+
+    # в чат админа (удаление исходных сообщений) и в канал - одинаковый лимит
+    TelegramRateLimiter(
+        args.telegram_rate,
+        private_rate=args.chat_rate,
+        group_rate=args.chat_rate,
+        priority_chats=[envs.CHANNEL_ID],
+    ).install()
+    envs.BOT = telebot.TeleBot(envs.BOT_TOKEN, parse_mode="HTML", threaded=False)
+    envs.DOWNLOADER = FileDownloader(envs.BOT_TOKEN, max_parallel=args.download_workers)
+    return envs
+
+
+def run_ingest(api: FakeBotApi, envs: MyEnvs, args: argparse.Namespace) -> dict:
+    """Фото-сообщения от админа в `handlers.process_message`, ждём, пока все встанут в очередь
+    (бот удаляет исходное сообщение)"""
+
+    cases = [(img.shape[1], img.shape[0], encode(img)) for _, img in iter_cases()]
+    messages = []
+    for i, (width, height, data) in zip(range(args.messages), cycle(cases)):
+        photo = api.add_file(data, width, height)
+        album = f"album{i // args.album_size}" if args.album_size > 1 else None
+        messages.append(api.photo_message(photo, envs.ADMIN_USER_ID, album))
+    logger.info("Приём: %d сообщений в %d потоков", len(messages), args.ingest_threads)
+
+    started_at: dict[str, float] = {}
+
+    def ingest(message_json: dict):
+        started_at[str(message_json["message_id"])] = time.perf_counter()
+        handlers.process_message(Message.de_json(message_json), envs)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.ingest_threads) as executor:
+        list(executor.map(ingest, messages))
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        deleted = {
+            call.params.get("message_id"): call.time for call in api.calls_of("deleteMessage")
+        }
+        errors = len(api.calls_of("sendMessage"))  # сообщения админу - только об ошибках
+        if len(deleted) + errors >= len(messages):
+            break
+        time.sleep(0.05)
+    else:
+        logger.warning("Не все сообщения обработаны за %s сек.", args.timeout)
+
+    latencies = [deleted[mid] - t for mid, t in started_at.items() if mid in deleted]
+    finished = max(deleted.values(), default=started)
+    result = _summary(latencies, len(latencies), finished - started)
+    result["errors"] = errors
+    return result
+
+
+def run_posting(envs: MyEnvs, args: argparse.Namespace) -> dict:
+    """Отправка всей очереди в канал в `post_threads` потоков"""
+
+    channel = envs.CHANNELS[MAIN_CHANNEL]
+    logger.info(
+        "Отправка: %d в очереди, по %d, потоков %d",
+        channel.queue_index.count(),
+        args.post_batch,
+        args.post_threads,
+    )
+    latencies: list[float] = []
+    sent = 0
+    lock = threading.Lock()
+
+    def post():
+        nonlocal sent
+        while True:
+            call_started = time.perf_counter()
+            resp = handlers.send_queue_to_channel(envs, channel, args.post_batch, sender="load")
+            if "Отправлено" not in resp:
+                return
+            with lock:
+                latencies.append(time.perf_counter() - call_started)
+                sent += int(resp.split()[-1])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.post_threads) as executor:
+        for future in [executor.submit(post) for _ in range(args.post_threads)]:
+            future.result()
+    return _summary(latencies, sent, time.perf_counter() - started)
+
+
+def run(args: argparse.Namespace) -> dict:
+    api = FakeBotApi(
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        send_delay=args.send_delay,
+    ).start()
+    apihelper.API_URL = api.api_url
+    apihelper.FILE_URL = api.file_url
+
+    envs = build_envs(args)
+    try:
+        result = {
+            "commit": current_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "args": vars(args),
+            "ingest": run_ingest(api, envs, args),
+            "posting": run_posting(envs, args),
+            "api_calls": dict(api.counts),
+            "api_429": dict(api.rate_limited),
+        }
+    finally:
+        envs.CROP_POOL.shutdown()
+        envs.DOWNLOADER.shutdown()
+        api.shutdown()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест на локальном Bot API")
+    parser.add_argument("--messages", type=int, default=100, help="фото-сообщений")
+    parser.add_argument("--album-size", type=int, default=1, help="фото в альбоме (1 - без)")
+    parser.add_argument("--ingest-threads", type=int, default=2, help="потоков приёма")
+    parser.add_argument("--workers", type=int, default=1, help="см. CROP_WORKERS")
+    parser.add_argument("--download-workers", type=int, default=4, help="см. DOWNLOAD_WORKERS")
+    parser.add_argument("--post-threads", type=int, default=1, help="потоков отправки")
+    parser.add_argument("--post-batch", type=int, default=1, help="изображений в посте")
+    parser.add_argument("--telegram-rate", type=float, default=25, help="см. TELEGRAM_RATE")
+    parser.add_argument(
+        "--chat-rate", type=float, default=20, help="запросов в сек. в чат (Telegram: 1, канал 1/3)"
+    )
+    parser.add_argument(
+        "--rate-limit-every", type=int, default=0, help="каждая N-я отправка в чат - ответ 429"
+    )
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответе 429")
+    parser.add_argument("--send-delay", type=float, default=0, help="задержка ответа на отправку")
+    parser.add_argument("--timeout", type=float, default=300, help="сколько ждать приёма")
+    parser.add_argument("--data-dir", type=Path, help="папка данных бота (по-умолчанию временная)")
+    parser.add_argument("--output", type=Path, help="файл для результата (JSON)")
+    args = parser.parse_args()
+
+    log_format = "[%(asctime)s] %(levelname)s [%(filename)s.%(funcName)s] %(message)s"
+    logging.basicConfig(format=log_format, level=logging.INFO)
+    logging.getLogger("image_processing").setLevel("WARNING")
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime(r"%Y%m%d-%H%M%S")
+        commit = current_commit()
+        output = Path(RESULTS_DIR, f"{commit}_{stamp}.json")
+    output = output.absolute()
+
+    # пути бота (data/...) относительные - работаем в отдельной папке
+    cwd = Path.cwd()
+    data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix="load_test_"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(data_dir)
+    try:
+        result = run(args)
+    finally:
+        os.chdir(cwd)
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    logger.info("Приём: %s", result["ingest"])
+    logger.info("Отправка: %s", result["posting"])
+    logger.info("Запросы к API: %s, ответов 429: %s", result["api_calls"], result["api_429"])
+    logger.info("Этапы:\n%s", metrics.render_summary())
+
+    result["args"] = {k: str(v) if isinstance(v, Path) else v for k, v in result["args"].items()}
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    logger.info("Результат сохранён в '%s'", output)
+
+
+if __name__ == "__main__":
+    main()
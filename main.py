@@ -1,15 +1,55 @@
+import _thread
 import logging
+import signal
+import sys
 import threading
 import time
 from random import randrange
 
-import schedule
+import psutil
 import telebot
+import telebot.ext.reloader
 
+# cv2 и numpy (image_processing) загружаются при первом изображении, см. CropWorkers
+import bot_actions
 import handlers
+import metrics
+import profiling
 import queue_processor
+from channels import MAIN_CHANNEL, Channel, ChannelConfig, parse_channels
+from crop_workers import CropWorkers
+from file_downloader import FileDownloader
 from my_envs import MyEnvs
+from resource_governor import ResourceGovernor
+from scheduler import Scheduler
+from telegram_limiter import TelegramRateLimiter
+from utils.debug_writer import DebugRetention
 from utils.persist_state import State
+from webhook_server import WebhookServer
+
+_startup_marks = [("", psutil.Process().create_time())]
+"""Этапы запуска и время (unix) их окончания, начиная со старта процесса"""
+
+
+def startup_mark(stage: str):
+    _startup_marks.append((stage, time.time()))
+
+
+def log_startup_timing():
+    """Пишет в лог длительность этапов запуска (от старта процесса до опроса)"""
+
+    stages = ", ".join(
+        f"{stage} {end - start:.2f}"
+        for (_, start), (stage, end) in zip(_startup_marks, _startup_marks[1:])
+    )
+    logging.info(
+        "Запуск до опроса: %.2f сек., этапы: %s",
+        _startup_marks[-1][1] - _startup_marks[0][1],
+        stages,
+    )
+
+
+startup_mark("импорт")
 
 # region инициализации
 
@@ -23,15 +63,102 @@ envs = MyEnvs()
 
 # Настройки и состояние
 envs.STATE = State(data_path=envs.STATE_FILE, default_json_path="_default_settings.json")
+startup_mark("состояние")
+
+# каналы: у каждого своя очередь с индексом,
+# изменения извне (bulk_import.py и т.п.) отслеживаются watchdog
+envs.CHANNELS = {}
+for channel_config in [
+    ChannelConfig(MAIN_CHANNEL, envs.CHANNEL_ID),
+    *parse_channels(envs.EXTRA_CHANNELS),
+]:
+    channel = Channel(
+        channel_config, envs.QUEUE_DIR, envs.INFLIGHT_DIR, envs.IMAGES_GLOB_PATTERN, envs.STATE
+    )
+    channel.queue_index.start_watching()
+    envs.CHANNELS[channel.name] = channel
+bot_actions.recover_inflight(envs)
+
+# фоновые задачи спят до срока или до изменения состояния/очереди
+scheduler = Scheduler()
+envs.STATE._add_listener(scheduler.notify)
+for channel in envs.CHANNELS.values():
+    channel.queue_index.add_listener(scheduler.notify)
+startup_mark("очередь")
+
+# метрики (/stats, и HTTP в формате Prometheus, если задан порт)
+metrics.QUEUE_DEPTH.set_function(lambda: bot_actions.get_queue_count(envs))
+if envs.METRICS_PORT:
+    metrics.start_http_server(envs.METRICS_PORT, envs.METRICS_HOST)
+
+# профилирование по требованию (PROFILE_EVERY, PROFILE_SLOW_SECONDS)
+profile_config = profiling.ProfileConfig(
+    envs.TEMP_DIR.as_posix(), envs.PROFILE_EVERY, envs.PROFILE_SLOW_SECONDS
+)
+profiling.configure(profile_config)
+
+# отладочные изображения (CROP_DEBUG) пишутся в фоне, старые удаляются
+debug_retention = DebugRetention(envs.DEBUG_KEEP_FILES, envs.DEBUG_MAX_MB * 2**20)
+
+# сколько изображений обрабатывать одновременно, решает свободная память
+envs.GOVERNOR = ResourceGovernor(
+    max_rss_mb=envs.MEMORY_LIMIT_MB,
+    min_available_mb=envs.MEMORY_MIN_AVAILABLE_MB,
+    image_mb=envs.IMAGE_MEMORY_MB,
+)
+envs.GOVERNOR.add_listener(scheduler.notify)  # пауза приёма видна в статусе
+
+# обработка изображений вне потоков бота (кеш линий обрезки - по разрешению)
+envs.CROP_POOL = CropWorkers(
+    max_workers=envs.CROP_WORKERS,
+    max_pending=envs.CROP_MAX_PENDING,
+    cache_file=envs.CROP_CACHE_FILE,
+    profile_config=profile_config,
+    debug_retention=debug_retention,
+    governor=envs.GOVERNOR,
+)
+startup_mark("пул обработки")
+
+
+def _on_sigterm(*_):
+    """Остановка контейнера: выходим штатно, чтобы сработали atexit (запись состояния)"""
+    sys.exit(0)
+
+
+signal.signal(signal.SIGTERM, _on_sigterm)
+
+
+def _restart_with_flush(restart_file=telebot.ext.reloader.restart_file):
+    """Перезапуск по изменению кода (execl) не вызывает atexit: сначала записываем состояние"""
+    try:
+        envs.STATE._flush()
+    except Exception as ex:
+        logging.error("Не удалось сохранить состояние перед перезапуском", exc_info=ex)
+    restart_file()
+
+
+telebot.ext.reloader.restart_file = _restart_with_flush
 
 # бот
+# все запросы к API идут через общий лимитер, посты в каналы - в приоритете
+TelegramRateLimiter(
+    envs.TELEGRAM_RATE, priority_chats=[channel.chat_id for channel in envs.CHANNELS.values()]
+).install()
 telebot.apihelper.CONNECT_TIMEOUT = envs.STATE.connect_timeout
 telebot.apihelper.READ_TIMEOUT = envs.STATE.read_timeout
 bot = telebot.TeleBot(
     envs.BOT_TOKEN,
     parse_mode="HTML",
+    num_threads=envs.HANDLER_WORKERS,
 )
 envs.BOT = bot
+# файлы качаются по частям через общие соединения, альбомы - параллельно
+envs.DOWNLOADER = FileDownloader(
+    envs.BOT_TOKEN,
+    max_parallel=envs.DOWNLOAD_WORKERS,
+    timeout=(envs.STATE.connect_timeout, envs.STATE.read_timeout),
+)
+startup_mark("бот")
 
 # endregion
 
@@ -39,12 +166,37 @@ envs.BOT = bot
 
 
 def ready_check():
+    """Проверка бота (идёт параллельно с запуском опроса, чтобы его не задерживать).
+
+    При ошибке опрос останавливается и процесс завершается, как и раньше."""
+
     assert envs
     logging.info("Инициализация окружения успешно завершена")
 
-    assert envs.BOT
-    bot_info = envs.BOT.get_me()
-    logging.info("Инициализация бота, ответ: %s", bot_info)
+    try:
+        assert envs.BOT
+        started = time.perf_counter()
+        bot_info = envs.BOT.get_me()
+        logging.info(
+            "Инициализация бота (%.2f сек.), ответ: %s", time.perf_counter() - started, bot_info
+        )
+    except Exception as ex:
+        logging.critical("Бот не прошёл проверку, завершаем работу", exc_info=ex)
+        _thread.interrupt_main()
+        return
+
+    try:
+        if not envs.WEBHOOK_PORT:
+            envs.BOT.remove_webhook()  # иначе getUpdates вернёт 409
+        elif envs.WEBHOOK_URL:
+            envs.BOT.set_webhook(
+                url=envs.WEBHOOK_URL,
+                secret_token=envs.WEBHOOK_SECRET or None,
+                max_connections=envs.HANDLER_WORKERS,
+            )
+            logging.info("Webhook зарегистрирован: %s", envs.WEBHOOK_URL)
+    except Exception as ex:
+        logging.error("Не удалось настроить webhook", exc_info=ex)
 
 
 # endregion
@@ -52,15 +204,42 @@ def ready_check():
 # region фоновые потоки
 
 
-def background_ticks():
-    """Обновление статуса, обработка расписаний (schedule)
-    и прочие мелкие действия"""
+STATUS_RETRY_SECONDS = 60
+"""Как часто повторять обновление статуса, если ничего не менялось (после ошибок)"""
+
+
+def _status_key() -> tuple:
+    """То, от чего зависит сообщение со статусом"""
+    return (
+        tuple(channel.queue_index.count() for channel in envs.CHANNELS.values()),
+        envs.STATE.state_target_channel,
+        envs.STATE.state_status_message_id,
+        envs.GOVERNOR.paused_reason,
+    )
+
 
+def status_updates():
+    """Обновление статуса при изменении очереди или сообщения со статусом.
+
+    Всплеск изменений (например, массовый импорт) объединяется в одно редактирование
+    не чаще раза в `STATUS_UPDATE_INTERVAL` секунд, показывается последнее значение."""
+
+    last_key = None
+    last_update = 0.0
     while True:
+        scheduler.wait_for(
+            lambda last_key=last_key: _status_key() != last_key, timeout=STATUS_RETRY_SECONDS
+        )
+
+        # новое сообщение со статусом (/status) создаём сразу, остальное - копим
+        if envs.STATE.state_status_message_id != -1:
+            if (delay := last_update + envs.STATUS_UPDATE_INTERVAL - time.monotonic()) > 0:
+                time.sleep(delay)
+
+        last_key = _status_key()
+        last_update = time.monotonic()
         try:
-            queue_processor.update_pinned_message(envs)  # статус
-            schedule.run_pending()  # расписания
-            time.sleep(3)
+            queue_processor.update_pinned_message(envs)
         except Exception as ex:
             if "timeout" in str(ex):
                 logging.error("Поймали очередной таймаут, (тип %s), но тут не страшно", type(ex))
@@ -68,54 +247,50 @@ def background_ticks():
             logging.error("Неизвестная ошибка!", exc_info=ex)
 
 
-def endless_sending():
-    """Отправка сообщений из очереди"""
+def endless_sending(channel: Channel):
+    """Отправка сообщений из очереди канала (может работать в нескольких потоках,
+    у каждого канала - свои, так что медленная отправка в один не задерживает другие)
 
+    Поток спит, пока нет бюджета или очередь пуста, и просыпается сразу при их изменении.
+    При ошибке отправки поток не завершается: повтор через паузу, растущую до 30 минут."""
+
+    error_wait = 0
     while True:
-        messages_to_send = envs.STATE.state_number_of_messages_to_send
+        scheduler.wait_for(channel.can_send)
+        if not channel.take_from_budget():
+            continue  # бюджет забрал другой поток
 
-        if not messages_to_send:
-            time.sleep(60)  # не нужно проверять слишком часто
+        try:
+            resp = handlers.send_queue_to_channel(envs, channel, count=1, sender="schedule")
+        except Exception as ex:
+            channel.return_to_budget()  # файлы уже вернулись в очередь (см. send_queue_to_channel)
+            error_wait = min(max(error_wait * 2, 60), 30 * 60)
+            logging.error(
+                "Не удалось отправить пост в '%s', повтор через %s сек.:",
+                channel.name,
+                error_wait,
+                exc_info=ex,
+            )
+            time.sleep(error_wait)
             continue
 
-        resp = handlers.send_queue_to_channel(envs, count=1)
+        error_wait = 0
+
         if "Отправлено" in resp:
-            envs.STATE.state_number_of_messages_to_send = messages_to_send - 1
             wait_seconds = randrange(20 * 60, 30 * 60)
             logging.info(
-                "Отправили картинку, ответ: '%s', ждём: %s мин, %s сек.",
+                "Отправили картинку в '%s', ответ: '%s', ждём: %s мин, %s сек.",
+                channel.name,
                 resp,
                 wait_seconds // 60,
                 wait_seconds % 60,
             )
             time.sleep(wait_seconds)
         else:
-            logging.debug("Пришло время отправлять пост, но: %s", resp)
-
-            time.sleep(60)
-
-
-def add_messages():
-    """Обновляет переменную в настройках `state_number_of_messages_to_send`"""
-
-    add_amount = envs.STATE.number_of_messages_per_day or 0
-    # по идее тут всегда должна быть цифра, определённая в _default_settings.json
-    logging.info("Запущен метод добавления постов, планируется добавить: %s", add_amount)
-
-    if p := envs.STATE.state_number_of_messages_to_send:
-        add_amount += p
+            channel.return_to_budget()
+            logging.debug("Пришло время отправлять пост в '%s', но: %s", channel.name, resp)
 
-    envs.STATE.state_number_of_messages_to_send = add_amount
-    logging.info("Теперь Переменная 'state_number_of_messages_to_send' = %s", add_amount)
-
-
-def no_luck_today():
-    """Очищает переменную в настройках `state_number_of_messages_to_send`
-
-    (что бы не копились)"""
-
-    envs.STATE.state_number_of_messages_to_send = 0
-    logging.info("Переменная 'state_number_of_messages_to_send' установлена на '0'")
+            time.sleep(60)  # например, очередь разобрали параллельно или ошибка сети
 
 
 # endregion
@@ -125,7 +300,14 @@ def no_luck_today():
 def callback_handler(cbq: telebot.types.CallbackQuery):
     method, *args = cbq.data.split()
     if method == "queue_send" and args[0].isnumeric():
-        result = handlers.send_queue_to_channel(envs, count=int(args[0]))
+        # у старых кнопок канала нет - основной
+        channel = envs.CHANNELS.get(args[1] if len(args) > 1 else MAIN_CHANNEL)
+        if channel is None:
+            bot.answer_callback_query(cbq.id, text="Канал больше не настроен")
+            return
+        result = handlers.send_queue_to_channel(
+            envs, channel, count=int(args[0]), sender="button"
+        )
         bot.answer_callback_query(cbq.id, text=result)
 
 
@@ -145,18 +327,34 @@ def get_text_messages(message: telebot.types.Message):
             bot.reply_to(message=message, text=response)
 
 
-ready_check()
-
-schedule.every().day.at("12:00", "Europe/Moscow").do(add_messages)
-schedule.every().day.at("23:50", "Europe/Moscow").do(no_luck_today)
-threading.Thread(target=background_ticks, daemon=True).start()
-threading.Thread(target=endless_sending, daemon=True).start()
-
-bot.infinity_polling(
-    timeout=30,
-    long_polling_timeout=envs.STATE.read_timeout * 2,
-    interval=3,  # из базового polling
-    logger_level=None,
-    restart_on_change=True,
-    path_to_watch=__file__,
-)
+threading.Thread(target=ready_check, daemon=True).start()
+
+for channel in envs.CHANNELS.values():
+    # в начале окна публикации добавляется бюджет на день, в конце - сгорает
+    window_start, window_end = channel.window
+    scheduler.every_day_at(window_start, "Europe/Moscow", channel.add_daily_budget)
+    scheduler.every_day_at(window_end, "Europe/Moscow", channel.clear_budget)
+    for _ in range(max(envs.SENDER_WORKERS, 1)):
+        threading.Thread(target=endless_sending, args=(channel,), daemon=True).start()
+threading.Thread(target=scheduler.run_forever, daemon=True).start()
+threading.Thread(target=status_updates, daemon=True).start()
+
+startup_mark("фоновые потоки")
+log_startup_timing()
+
+if envs.WEBHOOK_PORT:
+    # обновления присылает Telegram (или POST сохранённого обновления при проверке)
+    webhook = WebhookServer(
+        bot, envs.WEBHOOK_HOST, envs.WEBHOOK_PORT, envs.WEBHOOK_PATH, envs.WEBHOOK_SECRET
+    )
+    bot._setup_change_detector(__file__)  # как restart_on_change при опросе (для /restart)
+    webhook.serve_forever()
+else:
+    bot.infinity_polling(
+        timeout=30,
+        long_polling_timeout=envs.STATE.read_timeout * 2,
+        interval=3,  # из базового polling
+        logger_level=None,
+        restart_on_change=True,
+        path_to_watch=__file__,
+    )
@@ -0,0 +1,282 @@
+"""Счётчики и гистограммы задержек этапов (формат Prometheus).
+
+Запись - взятие блокировки и пара сложений, поэтому метрики включены всегда.
+Процессы пула обработки (`crop_workers`) копят метрики у себя, а их прирост
+передаётся в основной процесс вместе с результатом (`take_delta` / `merge_delta`).
+
+Пример:
+    with STAGE_SECONDS.time(stage="decode"):
+        img = cv2.imdecode(...)
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+"""Границы корзин гистограмм (сек.)"""
+
+
+def _labels_key(labelnames: Sequence[str], labels: dict[str, str]) -> tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Sequence[str], key: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(labelnames, key), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Монотонно растущий счётчик (с метками)"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> dict[tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> Iterator[str]:
+        for key, value in sorted(self.samples().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+    def take_delta(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge_delta(self, delta: dict):
+        with self._lock:
+            for key, value in delta.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Histogram:
+    """Гистограмма значений (обычно длительностей в секундах) с метками"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # метки -> [количество по корзинам (последняя - +Inf), сумма, количество]
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def _empty(self) -> list:
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value: float, **labels: str):
+        key = _labels_key(self.labelnames, labels)
+        index = next((i for i, le in enumerate(self.buckets) if value <= le), len(self.buckets))
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = self._empty()
+            data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Замеряет длительность блока `with`"""
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> dict[tuple[str, ...], list]:
+        with self._lock:
+            return {key: [list(data[0]), data[1], data[2]] for key, data in self._values.items()}
+
+    def render(self) -> Iterator[str]:
+        for key, (counts, total, count) in sorted(self.samples().items()):
+            cumulative = 0
+            for le, bucket_count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, le=f"{le}")
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+    def quantile(self, key: tuple[str, ...], q: float) -> float | None:
+        """Оценка квантиля по корзинам (верхняя граница корзины)"""
+
+        data = self.samples().get(key)
+        if not data or not data[2]:
+            return None
+        rank, cumulative = q * data[2], 0
+        for le, bucket_count in zip(self.buckets, data[0]):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return le
+        return float("inf")
+
+    def take_delta(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge_delta(self, delta: dict):
+        with self._lock:
+            for key, (counts, total, count) in delta.items():
+                data = self._values.get(key)
+                if data is None:
+                    data = self._values[key] = self._empty()
+                data[0] = [a + b for a, b in zip(data[0], counts)]
+                data[1] += total
+                data[2] += count
+
+
+class Gauge:
+    """Текущее значение, которое вычисляется при чтении (например, длина очереди)"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._func: Callable[[], float] | None = None
+
+    def set_function(self, func: Callable[[], float]):
+        self._func = func
+
+    def value(self) -> float | None:
+        return None if self._func is None else self._func()
+
+    def render(self) -> Iterator[str]:
+        if (value := self.value()) is not None:
+            yield f"{self.name} {value:g}"
+
+
+# region метрики бота
+
+STAGE_SECONDS = Histogram(
+    "screens_stage_seconds",
+    "Длительность этапов обработки и отправки",
+    ["stage"],
+)
+"""Этапы: get_file, download, decode, navigation_bar, black_bg, encode, queue_write,
+send_photo, send_media_group"""
+
+IMAGES_TOTAL = Counter("screens_images_total", "Обработанные изображения", ["result"])
+TELEGRAM_429_TOTAL = Counter(
+    "screens_telegram_429_total", "Ответы Telegram 'Too Many Requests'", ["method"]
+)
+DOWNLOAD_RETRIES_TOTAL = Counter(
+    "screens_download_retries_total", "Повторы оборванных загрузок файлов"
+)
+QUEUE_DEPTH = Gauge("screens_queue_depth", "Изображений в очереди")
+
+REGISTRY: list[Counter | Histogram | Gauge] = [
+    STAGE_SECONDS,
+    IMAGES_TOTAL,
+    TELEGRAM_429_TOTAL,
+    DOWNLOAD_RETRIES_TOTAL,
+    QUEUE_DEPTH,
+]
+
+# endregion
+
+
+def take_delta() -> dict[str, dict]:
+    """Забирает накопленные значения (для передачи из процесса пула), обнуляя их"""
+
+    return {
+        metric.name: metric.take_delta()
+        for metric in REGISTRY
+        if isinstance(metric, (Counter, Histogram))
+    }
+
+
+def merge_delta(delta: dict[str, dict]):
+    """Добавляет значения, полученные из `take_delta` другого процесса"""
+
+    for metric in REGISTRY:
+        if metric.name in delta and isinstance(metric, (Counter, Histogram)):
+            metric.merge_delta(delta[metric.name])
+
+
+def render_prometheus() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def render_summary() -> str:
+    """Краткая сводка для админа (команда /stats)"""
+
+    lines = []
+    if (depth := QUEUE_DEPTH.value()) is not None:
+        lines.append(f"В очереди: {depth:g}")
+
+    for (stage,), (_, total, count) in sorted(STAGE_SECONDS.samples().items()):
+        p95 = STAGE_SECONDS.quantile((stage,), 0.95)
+        lines.append(
+            f"{stage}: {count} шт., сред. {total / count * 1000:.0f} мс, p95 ≤ {p95 * 1000:g} мс"
+        )
+
+    for counter in (IMAGES_TOTAL, TELEGRAM_429_TOTAL, DOWNLOAD_RETRIES_TOTAL):
+        for key, value in sorted(counter.samples().items()):
+            lines.append(f"{counter.name}{_format_labels(counter.labelnames, key)}: {value:g}")
+
+    return "\n".join(lines) or "Пока нет данных"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Запускает HTTP сервер метрик (`/metrics`) в фоновом потоке"""
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, server.server_port)
+    return server
@@ -4,6 +4,10 @@ from pathlib import Path
 
 from telebot import TeleBot
 
+from channels import Channel
+from crop_workers import CropWorkers
+from file_downloader import FileDownloader
+from resource_governor import ResourceGovernor
 from utils.persist_state import State
 
 
@@ -22,22 +26,72 @@ class MyEnvs:
     QUEUE_DIR = Path(_DATA_DIR, "queue")
     UPLOADED_DIR = Path(_DATA_DIR, "uploaded")
     TEMP_DIR = Path(_DATA_DIR, "temp")
+    INFLIGHT_DIR = Path(_DATA_DIR, "inflight")
+    """Файлы, забранные из очереди на время отправки (см. `bot_actions.claim_queue_images`)"""
 
     BOT: TeleBot
+    CROP_POOL: CropWorkers
+    """Пул обработки изображений (см. `CROP_WORKERS`, `CROP_MAX_PENDING`)"""
+    GOVERNOR: ResourceGovernor
+    """Допуск изображений к обработке по памяти (см. `MEMORY_LIMIT_MB`)"""
+    DOWNLOADER: FileDownloader
+    """Скачивание файлов Telegram (см. `DOWNLOAD_WORKERS`)"""
+
+    CHANNELS: dict[str, Channel]
+    """Каналы по имени: основной (`CHANNEL_ID`, очередь `QUEUE_DIR`) и `EXTRA_CHANNELS`.
+
+    У каждого своя очередь с индексом в памяти, бюджет и окно публикации"""
+
     STATE: State
     """Актуальные настройки и состояние.
-    
-    Внимание! Вызывает чтение/запись файла при обращении к аттрибутам!
-    
-    (кроме тех, что начинаются с `_`"""
+
+    Читается из памяти, изменения записываются в файл с небольшой задержкой
+    (см. `CachedPersistStateBase`)"""
 
     STATE_FILE = Path(_DATA_DIR, "state.json")
+    CROP_CACHE_FILE = Path(_DATA_DIR, "crop_cache.json")
+    """Кеш линий обрезки по разрешению (см. `crop_cache.CropGeometryCache`)"""
 
     BOT_TOKEN: str
     ADMIN_USER_ID: int
     CHANNEL_ID: int
     CROP_DEBUG: bool
+    PROFILE_EVERY: int = int(environ.get("PROFILE_EVERY", 0))
+    """Профилировать каждое N-е сообщение и обрезку (см. `profiling`), 0 - выключено"""
+    PROFILE_SLOW_SECONDS: float = float(environ.get("PROFILE_SLOW_SECONDS", 0))
+    """Сохранять профиль сообщений и обрезок медленнее порога, 0 - выключено"""
+    DEBUG_KEEP_FILES: int = int(environ.get("DEBUG_KEEP_FILES", 200))
+    DEBUG_MAX_MB: int = int(environ.get("DEBUG_MAX_MB", 200))
     IMAGES_GLOB_PATTERN: str = environ.get("IMAGES_GLOB_PATTERN", "*.jpg")
+    CROP_ANALYSIS_SCALE: int = int(environ.get("CROP_ANALYSIS_SCALE", 1))
+    CROP_BG_METHOD: str = environ.get("CROP_BG_METHOD", "projection")
+    """Способ обрезки чёрного фона (см. `image_processing.BG_CROP_METHODS`)"""
+    SAVE_UPLOADED: bool = bool(environ.get("SAVE_UPLOADED"))
+    CROP_WORKERS: int = int(environ.get("CROP_WORKERS", 1))
+    CROP_MAX_PENDING: int = int(environ.get("CROP_MAX_PENDING", 20))
+    MEMORY_LIMIT_MB: int = int(environ.get("MEMORY_LIMIT_MB", 0))
+    """Предел RSS бота вместе с пулом обработки, 0 - без предела"""
+    MEMORY_MIN_AVAILABLE_MB: int = int(environ.get("MEMORY_MIN_AVAILABLE_MB", 256))
+    IMAGE_MEMORY_MB: int = int(environ.get("IMAGE_MEMORY_MB", 100))
+    """Оценка памяти на обработку одного изображения"""
+    SENDER_WORKERS: int = int(environ.get("SENDER_WORKERS", 1))
+    """Потоков отправки на каждый канал"""
+    EXTRA_CHANNELS: str = environ.get("EXTRA_CHANNELS", "")
+    """Дополнительные каналы (формат - см. `channels.parse_channels`)"""
+    DOWNLOAD_WORKERS: int = int(environ.get("DOWNLOAD_WORKERS", 4))
+    TELEGRAM_RATE: float = float(environ.get("TELEGRAM_RATE", 25))
+    STATUS_UPDATE_INTERVAL: float = float(environ.get("STATUS_UPDATE_INTERVAL", 10))
+    METRICS_PORT: int = int(environ.get("METRICS_PORT", 0))
+    METRICS_HOST: str = environ.get("METRICS_HOST", "127.0.0.1")
+    HANDLER_WORKERS: int = int(environ.get("HANDLER_WORKERS", 2))
+    """Потоков обработки входящих сообщений (в обоих режимах)"""
+    WEBHOOK_PORT: int = int(environ.get("WEBHOOK_PORT", 0))
+    """Порт приёма обновлений через webhook, 0 - опрос (`infinity_polling`)"""
+    WEBHOOK_HOST: str = environ.get("WEBHOOK_HOST", "127.0.0.1")
+    WEBHOOK_PATH: str = environ.get("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_URL: str = environ.get("WEBHOOK_URL", "")
+    """Внешний адрес webhook для `set_webhook` (пусто - не регистрировать)"""
+    WEBHOOK_SECRET: str = environ.get("WEBHOOK_SECRET", "")
 
     STATUS_MESSAGE = "Изображений в очереди (/queue) : {cnt}"
 
@@ -60,8 +114,14 @@ class MyEnvs:
             else:
                 raise KeyError(f"Не найдена переменная окружения '{env_name}'")
 
+        if self.CROP_BG_METHOD not in ("projection", "contours"):
+            raise ValueError(
+                f"Значение переменной окружения: CROP_BG_METHOD = '{self.CROP_BG_METHOD}' "
+                "не прошло провверку (доступны: projection, contours)"
+            )
+
         try:
-            for x in [self.QUEUE_DIR, self.UPLOADED_DIR, self.TEMP_DIR]:
+            for x in [self.QUEUE_DIR, self.UPLOADED_DIR, self.TEMP_DIR, self.INFLIGHT_DIR]:
                 x.mkdir(parents=True, exist_ok=True)
         except Exception as ex:
             raise
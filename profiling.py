@@ -0,0 +1,197 @@
+"""Профилирование горячего пути по требованию (выключено, пока не задан `PROFILE_EVERY`
+или `PROFILE_SLOW_SECONDS`).
+
+* каждый N-й блок с одним именем (загрузка фото, обрезка, сохранение результата)
+  профилируется детерминированно (`cProfile`, файл `.prof`);
+* если задан порог, остальные блоки профилируются сэмплированием (стеки потока
+  раз в несколько мс, почти бесплатно) и сохраняются, только если были медленнее порога
+  (файл `.txt` в формате "collapsed stacks", подходит для flamegraph).
+
+Профили пишутся в `out_dir` (в боте - `TEMP_DIR`), хранятся последние `keep` файлов.
+"""
+
+import cProfile
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_GLOB = "profile_*"
+
+
+class ProfileConfig(NamedTuple):
+    """Настройки профилирования (передаются и в процессы пула обработки)"""
+
+    out_dir: str
+    every_n: int = 0
+    """Профилировать каждое N-е (0 - нет)"""
+    slow_seconds: float = 0
+    """Сохранять профиль блоков медленнее порога (0 - нет)"""
+    keep: int = 20
+    """Сколько последних профилей хранить"""
+    sample_interval: float = 0.005
+
+
+_config: ProfileConfig | None = None
+_counts: Counter[str] = Counter()
+_counts_lock = threading.Lock()
+_active = threading.local()
+
+
+def configure(config: ProfileConfig | None):
+    """Включает профилирование в текущем процессе (None или нулевые настройки - выключает)"""
+
+    global _config
+    if config is not None and not (config.every_n or config.slow_seconds):
+        config = None
+    _config = config
+    if config is not None:
+        Path(config.out_dir).mkdir(parents=True, exist_ok=True)
+        logger.info("Профилирование включено: %s", config)
+
+
+def profiled(name: str):
+    """Контекстный менеджер: профилирует блок, если это нужно по настройкам.
+
+    Вложенные блоки входят в профиль внешнего.
+    """
+    if _config is None or getattr(_active, "name", None):
+        return nullcontext()
+    return _profile(_config, name)
+
+
+@contextmanager
+def _profile(config: ProfileConfig, name: str):
+    with _counts_lock:
+        _counts[name] += 1
+        number = _counts[name]
+
+    deterministic = bool(config.every_n) and number % config.every_n == 0
+    if not deterministic and not config.slow_seconds:
+        yield
+        return
+
+    _active.name = name
+    profiler = cProfile.Profile() if deterministic else None
+    sampler = None if deterministic else _Sampler(threading.get_ident(), config.sample_interval)
+    started = time.perf_counter()
+    try:
+        if profiler:
+            profiler.enable()
+        else:
+            sampler.start()
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _active.name = None
+        if profiler:
+            profiler.disable()
+        else:
+            sampler.stop()
+
+        try:
+            if profiler:
+                _save(config, name, elapsed, ".prof", profiler.dump_stats)
+            elif elapsed >= config.slow_seconds:
+                _save(config, name, elapsed, ".txt", sampler.dump)
+        except Exception as ex:
+            logger.exception("Не удалось сохранить профиль:", exc_info=ex)
+
+
+def _save(config: ProfileConfig, name: str, elapsed: float, suffix: str, dump):
+    stamp = datetime.now().strftime(r"%Y%m%d-%H%M%S_%f")
+    path = Path(config.out_dir, f"profile_{stamp}_{name}_{elapsed * 1000:.0f}ms{suffix}")
+    dump(path.as_posix())
+    logger.info("Профиль '%s' (%.0f мс) сохранён в '%s'", name, elapsed * 1000, path)
+
+    old = sorted(Path(config.out_dir).glob(PROFILE_GLOB), key=lambda p: p.stat().st_mtime)
+    for file in old[: max(len(old) - config.keep, 0)]:
+        file.unlink(missing_ok=True)
+
+
+class _Sampler:
+    """Сэмплирующий профилировщик одного потока: стеки раз в `interval` секунд"""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.stacks: Counter[str] = Counter()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                file_name = Path(code.co_filename).name
+                stack.append(f"{code.co_name} ({file_name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# interval {self._interval}\n")
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# region отчёт
+
+
+def latest_profile(out_dir: str | Path) -> Path | None:
+    files = list(Path(out_dir).glob(PROFILE_GLOB))
+    return max(files, key=lambda p: p.stat().st_mtime) if files else None
+
+
+def hotspots(path: str | Path, limit: int = 15) -> str:
+    """Самые затратные функции профиля (собственное и общее время)"""
+
+    path = Path(path)
+    rows: list[tuple[float, float, str]] = []  # собственное, общее, функция
+
+    if path.suffix == ".prof":
+        stats = pstats.Stats(path.as_posix())
+        for (file, line, func), (_, _, tottime, cumtime, _) in stats.stats.items():  # type: ignore
+            rows.append((tottime, cumtime, f"{func} ({Path(file).name}:{line})"))
+        unit = "с"
+    else:
+        self_count: Counter[str] = Counter()
+        total_count: Counter[str] = Counter()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                stack, count = line.rsplit(" ", 1)
+                frames = stack.split(";")
+                self_count[frames[-1]] += int(count)
+                for frame in set(frames):
+                    total_count[frame] += int(count)
+        rows = [(self_count[frame], total, frame) for frame, total in total_count.items()]
+        unit = "сэмпл."
+
+    rows.sort(reverse=True)
+    lines = [f"{path.name}", f"собств. / общее ({unit}) - функция"]
+    for own, total, func in rows[:limit]:
+        lines.append(f"{own:.4g} / {total:.4g} - {func}")
+    return "\n".join(lines)
+
+
+# endregion
@@ -0,0 +1,169 @@
+import heapq
+import logging
+import os
+import threading
+from collections.abc import Callable
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+logger = logging.getLogger(__name__)
+
+
+class QueueIndex:
+    """Индекс файлов очереди в памяти, упорядоченный по времени изменения.
+
+    Заменяет glob/stat всей папки при каждом обращении: количество - O(1),
+    первые N - O(N log n). Запись в очередь из бота обновляет индекс напрямую (`add`,
+    `discard`), изменения извне (например, `bulk_import.py`) ловит watchdog.
+
+    Устаревшие записи кучи (удалённые или изменённые файлы) не удаляются сразу,
+    а отбрасываются при извлечении.
+
+    Подписчики (`add_listener`) вызываются после каждого изменения очереди.
+    """
+
+    def __init__(self, queue_dir: str | Path, pattern: str = "*.jpg") -> None:
+        """
+        Args:
+            queue_dir (str | Path): папка очереди
+            pattern (str, optional): glob паттерн файлов очереди (`IMAGES_GLOB_PATTERN`)
+        """
+        self._dir = Path(queue_dir)
+        self._abs_dir = Path(os.path.abspath(self._dir))
+        self._pattern = pattern
+        self._lock = threading.Lock()
+        self._mtimes: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+        self._observer = None
+        self._listeners: list[Callable[[], None]] = []
+
+        self.rescan()
+
+    def _matches(self, path: str | Path) -> bool:
+        path = Path(os.path.abspath(path))
+        return path.parent == self._abs_dir and fnmatchcase(path.name, self._pattern)
+
+    def rescan(self):
+        """Полностью перечитывает папку (при запуске или если что-то пошло не так)"""
+
+        mtimes = {}
+        for file in self._dir.glob(self._pattern):
+            try:
+                mtimes[file.name] = file.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+        with self._lock:
+            self._mtimes = mtimes
+            self._heap = [(mtime, name) for name, mtime in mtimes.items()]
+            heapq.heapify(self._heap)
+        logger.info("Индекс очереди перестроен: %d файлов", len(mtimes))
+        self._notify()
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Подписка на изменения очереди (вызывается из потока, изменившего очередь)"""
+
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as ex:
+                logger.exception("Ошибка подписчика индекса очереди:", exc_info=ex)
+
+    def add(self, path: str | Path):
+        """Добавляет (или обновляет) файл очереди"""
+
+        path = Path(path)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.discard(path)
+            return
+
+        with self._lock:
+            if self._mtimes.get(path.name) == mtime:
+                return
+            self._mtimes[path.name] = mtime
+            heapq.heappush(self._heap, (mtime, path.name))
+        self._notify()
+
+    def discard(self, path: str | Path):
+        """Убирает файл из индекса (запись в куче станет устаревшей)"""
+
+        with self._lock:
+            removed = self._mtimes.pop(Path(path).name, None) is not None
+        if removed:
+            self._notify()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._mtimes)
+
+    def oldest(self, count: int) -> list[Path]:
+        """Первые `count` файлов очереди (самые старые), без удаления из индекса"""
+
+        result: list[tuple[int, str]] = []
+        with self._lock:
+            while self._heap and len(result) < count:
+                mtime, name = heapq.heappop(self._heap)
+                if self._mtimes.get(name) != mtime:
+                    continue  # устаревшая запись
+                if result and result[-1][1] == name:
+                    continue  # дубль после повторного add с тем же временем
+                result.append((mtime, name))
+            for item in result:
+                heapq.heappush(self._heap, item)
+
+        return [Path(self._dir, name) for _, name in result]
+
+    # region watchdog
+
+    def start_watching(self):
+        """Запускает отслеживание изменений папки извне"""
+
+        if self._observer is not None:
+            return
+        self._observer = Observer()
+        self._observer.schedule(_QueueDirHandler(self), self._dir.as_posix(), recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def stop_watching(self):
+        if self._observer is None:
+            return
+        self._observer.stop()
+        self._observer.join(timeout=5)
+        self._observer = None
+
+    def _on_fs_event(self, event: FileSystemEvent):
+        if event.is_directory:
+            return
+
+        if event.event_type == "moved":
+            if self._matches(event.src_path):
+                self.discard(event.src_path)
+            if self._matches(event.dest_path):
+                self.add(event.dest_path)
+        elif self._matches(event.src_path):
+            if event.event_type == "deleted":
+                self.discard(event.src_path)
+            elif event.event_type in ("created", "modified", "closed"):
+                self.add(event.src_path)
+
+    # endregion
+
+
+class _QueueDirHandler(FileSystemEventHandler):
+    def __init__(self, index: QueueIndex) -> None:
+        self._index = index
+
+    def on_any_event(self, event: FileSystemEvent):
+        try:
+            self._index._on_fs_event(event)
+        except Exception as ex:
+            logger.exception("Ошибка обработки события папки очереди:", exc_info=ex)
@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import Future
 from datetime import datetime
 from pathlib import Path
 
@@ -6,32 +7,146 @@ from telebot.apihelper import ApiTelegramException
 from telebot.util import quick_markup
 
 import bot_actions
-import image_processing as imp
+import crop_workers
+import profiling
+from channels import Channel
+from metrics import IMAGES_TOTAL, STAGE_SECONDS
 from my_envs import MyEnvs
+from utils.debug_writer import DEBUG_PREFIX
+from utils.files import atomic_write_bytes
 
 logger = logging.getLogger(__name__)
 
-def process_one_image(image_path: str | Path, envs: MyEnvs):
+_last_status_text: str | None = None
+"""Текст, который сейчас в сообщении со статусом (чтобы не обновлять такой же)"""
+
+
+def _make_debug_path(envs: MyEnvs, suffix: str) -> str | None:
+    if not envs.CROP_DEBUG:
+        return None
+
+    # Создаём файлы сравнений и сохраняем в TEMP_DIR
+    # тут делаем имя удобным, в других местах в этом нет смысла,
+    # так как работа с файлами напрямую не предполагается
+    # подробный лог включается только на время обработки этого изображения (debug_scope)
+    dt_file_name = datetime.now().strftime(r"%Y%m%d-%H%M%S_%f")
+    return Path(envs.TEMP_DIR, f"{DEBUG_PREFIX}{dt_file_name}{suffix}").as_posix()
+
+
+def process_one_image(image_path: str | Path, envs: MyEnvs, channel: Channel):
     if isinstance(image_path, str):
         image_path = Path(image_path)
 
-    debug_path = None
-    if envs.CROP_DEBUG:
-        # Создаём файлы сравнений и сохраняем в TEMP_DIR
-        # тут делаем имя удобным, в других местах в этом нет смысла,
-        # так как работа с файлами напрямую не предполагается
-        dt_file_name = datetime.now().strftime(r"%Y%m%d-%H%M%S_%f")
-        debug_path = Path(envs.TEMP_DIR, dt_file_name).with_suffix(image_path.suffix).as_posix()
-        imp.crop_logger.setLevel("DEBUG")
-
-    queue_path = Path(envs.QUEUE_DIR, image_path.name)
-    imp.create_cropped_image(image_path.as_posix(), queue_path.as_posix(), debug_path=debug_path)
+    debug_path = _make_debug_path(envs, image_path.suffix)
+
+    queue_path = Path(channel.queue_dir, image_path.name)
+    imp = envs.CROP_POOL.image_processing()
+    with envs.CROP_POOL.admission(), profiling.profiled("crop"):
+        imp.create_cropped_image(
+            image_path.as_posix(),
+            queue_path.as_posix(),
+            debug_path=debug_path,
+            bg_crop_method=envs.CROP_BG_METHOD,
+            analysis_scale=envs.CROP_ANALYSIS_SCALE,
+        )
     if queue_path.exists() and queue_path.stat().st_size > 0:  # изображение создалось
+        channel.queue_index.add(queue_path)
+        IMAGES_TOTAL.inc(result="queued")
         image_path.unlink()
     return queue_path.as_posix()
 
 
+def _write_to_queue(queue_path: Path, data: bytes, channel: Channel):
+    """Атомарно сохраняет обработанное изображение в очередь и добавляет в индекс"""
+
+    with STAGE_SECONDS.time(stage="queue_write"):
+        atomic_write_bytes(queue_path, data)
+    channel.queue_index.add(queue_path)
+    IMAGES_TOTAL.inc(result="queued")
+
+
+def submit_image_bytes(
+    file_name: str, data: bytes, envs: MyEnvs, channel: Channel
+) -> "Future[str]":
+    """Обрезает скачанное изображение в пуле `envs.CROP_POOL` и атомарно сохраняет
+    результат в очередь.
+
+    Пустой `data` означает, что изображение уже в очереди (см. `download_biggest_image`).
+
+    Возвращает Future с путём в очереди (файл уже записан, когда он готов).
+    Запись и колбэки Future выполняются в потоках завершения пула (см. `CropWorkers`).
+    Может выбросить `PoolSaturatedError`, если пул переполнен."""
+
+    queue_path = Path(channel.queue_dir, file_name)
+    result: Future[str] = Future()
+    if not data:
+        result.set_result(queue_path.as_posix())
+        return result
+
+    debug_path = _make_debug_path(envs, queue_path.suffix)
+    crop_future = envs.CROP_POOL.submit(
+        crop_workers.crop_bytes,
+        data,
+        queue_path.suffix,
+        debug_path,
+        envs.CROP_BG_METHOD,
+        envs.CROP_ANALYSIS_SCALE,
+    )
+
+    def save_result(future: Future):
+        # сюда же входят колбэки `result` (удаление исходного сообщения)
+        with profiling.profiled("complete"):
+            try:
+                _write_to_queue(queue_path, future.result(), channel)
+                result.set_result(queue_path.as_posix())
+            except Exception as ex:
+                result.set_exception(ex)
+
+    crop_future.add_done_callback(save_result)
+    return result
+
+
+def submit_images_bytes(
+    items: list[tuple[str, bytes]], envs: MyEnvs, channel: Channel
+) -> "Future[list[str]]":
+    """Пакетный вариант `submit_image_bytes` (для альбомов): одинаковые по размеру
+    изображения анализируются вместе. Future - с путями в очереди в том же порядке."""
+
+    queue_paths = [Path(channel.queue_dir, file_name) for file_name, _ in items]
+    to_process = [(path, data) for path, (_, data) in zip(queue_paths, items) if data]
+    result: Future[list[str]] = Future()
+    if not to_process:
+        result.set_result([path.as_posix() for path in queue_paths])
+        return result
+
+    crop_future = envs.CROP_POOL.submit(
+        crop_workers.crop_bytes_batch,
+        [(data, path.suffix) for path, data in to_process],
+        [_make_debug_path(envs, path.suffix) for path, _ in to_process],
+        envs.CROP_BG_METHOD,
+        envs.CROP_ANALYSIS_SCALE,
+        weight=len(to_process),
+    )
+
+    def save_result(future: Future):
+        with profiling.profiled("complete"):
+            try:
+                for (path, _), data in zip(to_process, future.result()):
+                    _write_to_queue(path, data, channel)
+                result.set_result([path.as_posix() for path in queue_paths])
+            except Exception as ex:
+                result.set_exception(ex)
+
+    crop_future.add_done_callback(save_result)
+    return result
+
+
 def update_pinned_message(envs: MyEnvs):
+    """Создаёт или обновляет сообщение со статусом, если его текст изменился.
+
+    Как часто вызывать - решает вызывающий (см. `status_updates` в main.py)"""
+
+    global _last_status_text
     bot = envs.BOT
 
     message_id = envs.STATE.state_status_message_id
@@ -40,12 +155,19 @@ def update_pinned_message(envs: MyEnvs):
 
     cnt = bot_actions.get_queue_count(envs)
     new_status_msg = envs.STATUS_MESSAGE.format(cnt=cnt)
-    if getattr(envs.STATE, "state_last_status_message_text", None) == new_status_msg:
+    target = bot_actions.get_target_channel(envs)
+    if len(envs.CHANNELS) > 1:  # по каналам, ➡️ - куда идут новые картинки (/channel)
+        for channel in envs.CHANNELS.values():
+            mark = "➡️ " if channel is target else ""
+            new_status_msg += f"\n{mark}{channel.name}: {channel.queue_index.count()}"
+    if paused_reason := envs.GOVERNOR.paused_reason:
+        new_status_msg += f"\n⏸ Приём изображений приостановлен: {paused_reason}"
+    if message_id != -1 and _last_status_text == new_status_msg:
         return  # статус не изменился
 
     # если дошли сюда: нужно либо обновлять, либо создавать, готовимся:
     markup = quick_markup({
-        '➡️🖼️ 1!': {'callback_data': 'queue_send 1'}
+        '➡️🖼️ 1!': {'callback_data': f'queue_send 1 {target.name}'}
     }, row_width=1)
     message_args = {
         "message_id": message_id,
@@ -69,6 +191,7 @@ def update_pinned_message(envs: MyEnvs):
         )
 
         envs.STATE.state_status_message_id = new_msg.message_id
+        _last_status_text = new_status_msg
         return
 
     # если дошли сюда - предполагаем наличие сообщения в закрепе и есть чем его обновлять
@@ -77,12 +200,12 @@ def update_pinned_message(envs: MyEnvs):
     # так как периодически поле pinned_message приходит пустым, даже когда закреп есть
     try:
         bot.edit_message_text(**message_args)
-        envs.STATE.state_last_status_message_text = new_status_msg
+        _last_status_text = new_status_msg
 
     except ApiTelegramException as ex:
         if "Bad Request: message is not modified" in ex.description:
-            # если в закрепе уже такое же сообщение, то обновляем его в файле
-            envs.STATE.state_last_status_message_text = new_status_msg
+            # если в закрепе уже такое же сообщение, то просто запоминаем его
+            _last_status_text = new_status_msg
             return
 
         if "Too Many Requests" in ex.description:
@@ -96,8 +219,9 @@ def update_pinned_message(envs: MyEnvs):
             else:
                 to_wait_str = "НЕТ ЗНАЧЕНИЯ"
 
+            # ждать тут не нужно: лимитер (telegram_limiter) уже заблокировал этот чат
+            # на retry_after, следующая попытка обновления дождётся разблокировки
             logger.warning("Похоже, что нас забанил сервер! Ждать: %s\n%s", to_wait_str, repr(ex))
-            # TODO: может добавить ожидание прям тут?
             return
 
         # но сюда же, видимо, попадаем и при других ошибках, надо бы отладить:
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+_MB = 2**20
+
+_CGROUP_FILES = (
+    # cgroup v2 и v1: лимит памяти и текущее потребление контейнера
+    (Path("/sys/fs/cgroup/memory.max"), Path("/sys/fs/cgroup/memory.current")),
+    (
+        Path("/sys/fs/cgroup/memory/memory.limit_in_bytes"),
+        Path("/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+    ),
+)
+
+
+def _cgroup_available() -> int | None:
+    """Сколько памяти осталось до лимита контейнера (None - лимита нет)"""
+
+    for limit_file, usage_file in _CGROUP_FILES:
+        try:
+            limit = limit_file.read_text().strip()
+            usage = int(usage_file.read_text().strip())
+        except (OSError, ValueError):
+            continue
+        if not limit.isdecimal() or int(limit) >= 2**60:  # "max" или "без лимита" в v1
+            return None
+        return int(limit) - usage
+    return None
+
+
+class ResourceGovernor:
+    """Допуск изображений к обработке с учётом памяти.
+
+    Каждое изображение при декодировании и анализе занимает несколько полноразмерных
+    копий, поэтому перед обработкой "резервируется" `image_mb` на каждое изображение
+    в работе, включая новое (с запасом: память уже идущих частично учтена в RSS).
+    Пока резерв не помещается в `max_rss_mb` (RSS процесса вместе с процессами пула)
+    или свободной памяти (системы или контейнера) останется меньше `min_available_mb`,
+    новые изображения ждут (`acquire`), а `paused_reason` объясняет причину (для статуса).
+
+    Одно изображение допускается всегда, чтобы обработка не останавливалась совсем.
+    """
+
+    def __init__(
+        self,
+        max_rss_mb: int = 0,
+        min_available_mb: int = 256,
+        image_mb: int = 100,
+        check_interval: float = 0.5,
+    ) -> None:
+        """
+        Args:
+            max_rss_mb (int, optional): предел RSS процесса и процессов пула (0 - без предела)
+            min_available_mb (int, optional): сколько памяти должно оставаться свободной
+            image_mb (int, optional): оценка памяти на обработку одного изображения
+            check_interval (float, optional): как часто перепроверять память при паузе
+        """
+        self.max_rss = max_rss_mb * _MB
+        self.min_available = min_available_mb * _MB
+        self.image_bytes = image_mb * _MB
+        self._check_interval = check_interval
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._process = psutil.Process()
+        self._listeners: list[Callable[[], None]] = []
+
+        self.paused_reason: str | None = None
+        """Почему приём изображений приостановлен (None - не приостановлен)"""
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Подписка на приостановку и возобновление приёма"""
+
+        self._listeners.append(callback)
+
+    # region замеры
+
+    def rss(self) -> int:
+        """RSS процесса вместе с дочерними (пул обработки)"""
+
+        total = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue  # процесс уже завершился
+        return total
+
+    def available(self) -> int:
+        """Свободная память: системы или контейнера, что меньше"""
+
+        available = psutil.virtual_memory().available
+        if (cgroup := _cgroup_available()) is not None:
+            available = min(available, cgroup)
+        return available
+
+    # endregion
+
+    def _blocking_reason(self, weight: int) -> str | None:
+        if not self._in_flight:
+            return None
+
+        # текст не зависит от текущих замеров, чтобы не менять статус при каждой проверке
+        need = (self._in_flight + weight) * self.image_bytes
+        if self.max_rss and self.rss() + need > self.max_rss:
+            return f"бот занял почти всю отведённую память ({self.max_rss // _MB} МБ)"
+        if self.available() - need < self.min_available:
+            return f"мало свободной памяти (нужно оставлять {self.min_available // _MB} МБ)"
+        return None
+
+    def _set_paused(self, reason: str | None):
+        if reason == self.paused_reason:
+            return
+        if reason:
+            logger.warning("Приём изображений приостановлен: %s", reason)
+        else:
+            logger.info("Приём изображений возобновлён")
+        self.paused_reason = reason
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as ex:
+                logger.exception("Ошибка подписчика:", exc_info=ex)
+
+    def acquire(self, weight: int = 1, timeout: float | None = None) -> bool:
+        """Ждёт, пока `weight` изображений можно взять в обработку.
+
+        Returns:
+            bool: False - память так и не освободилась за `timeout` секунд
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while reason := self._blocking_reason(weight):
+                    self._set_paused(reason)
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    wait = self._check_interval
+                    self._cond.wait(wait if remaining is None else min(wait, remaining))
+
+                self._in_flight += weight
+                return True
+            finally:
+                self._waiting -= 1
+                if not self._waiting:
+                    self._set_paused(None)
+
+    def release(self, weight: int = 1):
+        with self._cond:
+            self._in_flight -= weight
+            self._cond.notify_all()
+
+
+@contextmanager
+def log_peak_rss(label: str, interval: float = 0.005) -> Iterator[None]:
+    """Пишет в лог RSS текущего процесса до и после блока и пиковый RSS за время блока.
+
+    Пик - максимум замеров раз в `interval` секунд из фонового потока (короче интервала
+    всплески могут не попасть), а не пик за всё время жизни процесса (`ru_maxrss`).
+    """
+
+    process = psutil.Process()
+    before = process.memory_info().rss
+    peak = before
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        done.set()
+        sampler.join()
+        after = process.memory_info().rss
+        logger.info(
+            "Память (%s): RSS %d -> %d МБ, пик за обработку %d МБ",
+            label,
+            before // _MB,
+            after // _MB,
+            max(peak, after) // _MB,
+        )
@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Планировщик на куче таймеров и условной переменной.
+
+    Вместо циклов с `sleep` задачи спят до своего срока (`call_at`, `call_later`,
+    `every_day_at`), а ожидающие потоки (`wait_for`) - до изменения состояния
+    или очереди (`notify`). Так нет холостых пробуждений и задержки реакции.
+
+    Методы планирования возвращают номер задачи для `cancel`.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._timers: list[tuple[float, int, Callable, tuple]] = []
+        self._seq = itertools.count()  # при равных сроках - в порядке добавления
+        self._cancelled: set[int] = set()
+
+    def call_at(self, when: float, func: Callable, *args) -> int:
+        """Выполнить `func(*args)` в момент `when` (unix time)"""
+
+        return self._push(when, next(self._seq), func, args)
+
+    def _push(self, when: float, timer_id: int, func: Callable, args: tuple) -> int:
+        with self._cond:
+            heapq.heappush(self._timers, (when, timer_id, func, args))
+            self._cond.notify_all()
+        return timer_id
+
+    def call_later(self, delay: float, func: Callable, *args) -> int:
+        return self.call_at(time.time() + delay, func, *args)
+
+    def every_day_at(self, at: str, tz: str, func: Callable, *args) -> int:
+        """Выполнять `func(*args)` ежедневно в `at` ("ЧЧ:ММ") по часовому поясу `tz`.
+
+        Номер задачи один на все повторы"""
+
+        timer_id = next(self._seq)
+
+        def run_and_reschedule():
+            try:
+                func(*args)
+            finally:
+                with self._cond:
+                    cancelled = timer_id in self._cancelled
+                    self._cancelled.discard(timer_id)
+                if not cancelled:  # отменили во время выполнения
+                    self._push(_next_daily(at, tz), timer_id, run_and_reschedule, ())
+
+        return self._push(_next_daily(at, tz), timer_id, run_and_reschedule, ())
+
+    def cancel(self, timer_id: int):
+        """Отменяет задачу (для `every_day_at` - и все следующие повторы).
+
+        Уже выполняющаяся задача не прерывается"""
+
+        with self._cond:
+            timers = [timer for timer in self._timers if timer[1] != timer_id]
+            if len(timers) != len(self._timers):
+                self._timers = timers
+                heapq.heapify(self._timers)
+            else:
+                self._cancelled.add(timer_id)  # выполняется сейчас (см. `every_day_at`)
+            self._cond.notify_all()
+
+    def notify(self, *_):
+        """Будит всех, кто ждёт в `wait_for` (состояние или очередь изменились)"""
+
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: float | None = None) -> bool:
+        """Ждёт, пока `predicate()` не станет истинным (проверяется при каждом `notify`).
+
+        Returns:
+            bool: результат `predicate()` (False - вышел таймаут)
+        """
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
+
+    def run_forever(self):
+        """Выполняет задачи по срокам (запускать в отдельном потоке)"""
+
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    if self._timers and self._timers[0][0] <= now:
+                        _, _, func, args = heapq.heappop(self._timers)
+                        break
+                    timeout = self._timers[0][0] - now if self._timers else None
+                    self._cond.wait(timeout)
+
+            try:
+                func(*args)
+            except Exception as ex:
+                logger.error("Ошибка в задаче по расписанию %s", func, exc_info=ex)
+
+
+def _next_daily(at: str, tz: str) -> float:
+    """Ближайший момент (unix time) времени `at` ("ЧЧ:ММ") в часовом поясе `tz`"""
+
+    zone = pytz.timezone(tz)
+    hours, minutes = (int(x) for x in at.split(":"))
+    now = datetime.now(zone)
+
+    day = now.date()
+    while True:
+        candidate = zone.localize(datetime.combine(day, dt_time(hours, minutes)))
+        if candidate > now:
+            return candidate.timestamp()
+        day += timedelta(days=1)
@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+from collections.abc import Iterable
+
+import requests
+from telebot import apihelper
+
+from metrics import TELEGRAM_429_TOTAL
+
+logger = logging.getLogger(__name__)
+
+UNLIMITED_METHODS = frozenset({"getUpdates", "getMe", "getFile", "getChat", "answerCallbackQuery"})
+"""Методы, которые не расходуют лимиты отправки (но учитывают блокировку по retry_after)"""
+
+LOW_PRIORITY_METHODS = frozenset({"editMessageText", "pinChatMessage", "unpinChatMessage"})
+"""Обновление статуса: уступает остальным, когда лимит на исходе"""
+
+PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = 0, 1, 2
+
+
+class TokenBucket:
+    """Классическое "ведро токенов": `rate` в секунду, не больше `capacity` разом"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+    def delay(self, now: float, need: float = 1) -> float:
+        """Сколько ждать, пока в ведре будет `need` токенов"""
+
+        self._refill(now)
+        return max(0.0, (need - self.tokens) / self.rate)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class TelegramRateLimiter:
+    """Общий лимитер запросов к Bot API для всех потоков бота.
+
+    Ставится вместо HTTP-отправителя telebot (`install`), поэтому действует на все вызовы
+    `envs.BOT.*` без изменения мест вызова:
+
+    * общее ведро на бота и отдельное ведро на каждый чат
+      (личные чаты быстрее, группы и каналы - по `group_rate`);
+    * ответ 429 блокирует чат (или весь бот, если чата нет) на `retry_after` секунд,
+      запрос повторяется сам, если ждать не дольше `max_retry_wait`;
+    * без `retry_after` - экспоненциальная задержка;
+    * посты в каналы из `priority_chats` идут вперёд, редактирование статуса - последним:
+      запрос с меньшим приоритетом не берёт токен из общего ведра,
+      если его ждут запросы с большим, которые могут отправиться сразу
+      (ожидающие токена своего чата или разблокировки - не мешают).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 25,
+        private_rate: float = 1,
+        group_rate: float = 20 / 60,
+        priority_chats: Iterable[int | str] = (),
+        max_retries: int = 3,
+        max_retry_wait: float = 60,
+    ) -> None:
+        """
+        Args:
+            global_rate (float, optional): запросов в секунду на бота
+            private_rate (float, optional): запросов в секунду в личный чат
+            group_rate (float, optional): запросов в секунду в группу/канал
+            priority_chats (Iterable[int | str], optional): чаты с наивысшим приоритетом
+            max_retries (int, optional): повторов после ответа 429
+            max_retry_wait (float, optional): дольше этого ждать перед повтором не будем,
+                ошибка вернётся вызывающему (блокировка чата при этом сохранится)
+        """
+        self._global = TokenBucket(global_rate, global_rate)
+        self._private_rate = private_rate
+        self._group_rate = group_rate
+        self._priority_chats = {str(chat) for chat in priority_chats}
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+
+        self._cond = threading.Condition()
+        self._chats: dict[str, TokenBucket] = {}
+        self._blocked_until: dict[str | None, float] = {}  # None - весь бот
+        # ожидающих токена общего ведра: по приоритетам, по чатам (None - без чата)
+        self._waiting: list[dict[str | None, int]] = [{}, {}, {}]
+        self._local = threading.local()
+
+    def install(self):
+        """Направляет все запросы telebot через лимитер"""
+
+        apihelper.CUSTOM_REQUEST_SENDER = self.request
+
+    # region лимиты
+
+    def _chat_bucket(self, chat: str) -> TokenBucket:
+        if chat not in self._chats:
+            # у личных чатов положительный id, у групп и каналов - отрицательный или @имя
+            private = chat.isdecimal()
+            rate = self._private_rate if private else self._group_rate
+            self._chats[chat] = TokenBucket(rate, max(1.0, rate))
+        return self._chats[chat]
+
+    def _priority(self, method_name: str, chat: str | None) -> int:
+        if chat is not None and chat in self._priority_chats:
+            return PRIORITY_HIGH
+        if method_name in LOW_PRIORITY_METHODS:
+            return PRIORITY_LOW
+        return PRIORITY_NORMAL
+
+    def _ready_before(self, priority: int, now: float) -> int:
+        """Сколько ожидающих с большим, чем `priority`, приоритетом могут отправить запрос
+        сразу: их чат не заблокирован и в его ведре есть токены"""
+
+        ready = 0
+        for waiting in self._waiting[:priority]:
+            for chat, count in waiting.items():
+                if chat is None:
+                    ready += count
+                elif self._blocked_until.get(chat, 0) <= now:
+                    ready += min(count, int(self._chat_bucket(chat).available(now)))
+        return ready
+
+    def acquire(self, method_name: str, chat: str | None):
+        """Ждёт разрешения на запрос (блокировки, токены, приоритет)"""
+
+        limited = method_name not in UNLIMITED_METHODS
+        priority = self._priority(method_name, chat)
+        waiting = self._waiting[priority]
+
+        with self._cond:
+            if limited:
+                waiting[chat] = waiting.get(chat, 0) + 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(
+                        self._blocked_until.get(None, 0),
+                        self._blocked_until.get(chat, 0) if chat is not None else 0,
+                    ) - now
+
+                    if wait <= 0 and limited:
+                        # токены общего ведра сначала достаются более важным запросам
+                        reserved = self._ready_before(priority, now)
+                        wait = self._global.delay(now, need=reserved + 1)
+                        if chat is not None:
+                            wait = max(wait, self._chat_bucket(chat).delay(now))
+
+                    if wait <= 0:
+                        if limited:
+                            self._global.take(now)
+                            if chat is not None:
+                                self._chat_bucket(chat).take(now)
+                        return
+                    self._cond.wait(wait)
+            finally:
+                if limited:
+                    waiting[chat] -= 1
+                    if not waiting[chat]:
+                        del waiting[chat]
+                self._cond.notify_all()
+
+    def block(self, chat: str | None, seconds: float):
+        """Запрещает запросы в чат (или все, если `chat` = None) на `seconds` секунд"""
+
+        with self._cond:
+            until = time.monotonic() + seconds
+            self._blocked_until[chat] = max(self._blocked_until.get(chat, 0), until)
+            self._cond.notify_all()
+
+    # endregion
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Замена `requests.request` для `apihelper.CUSTOM_REQUEST_SENDER`"""
+
+        method_name = url.rsplit("/", 1)[-1]
+        params = kwargs.get("params") or {}
+        chat = str(params["chat_id"]) if params.get("chat_id") is not None else None
+
+        attempt = 0
+        while True:
+            self.acquire(method_name, chat)
+            response = self._session().request(method, url, **kwargs)
+            if response.status_code != 429:
+                return response
+
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after")
+            except ValueError:
+                retry_after = None
+            if not isinstance(retry_after, (int, float)):
+                retry_after = 2**attempt  # сервер не сказал, сколько ждать
+
+            TELEGRAM_429_TOTAL.inc(method=method_name)
+            self.block(chat, retry_after)
+            logger.warning(
+                "Telegram просит подождать %s сек. (метод %s, чат %s, попытка %d)",
+                retry_after,
+                method_name,
+                chat,
+                attempt + 1,
+            )
+
+            attempt += 1
+            if attempt > self.max_retries or retry_after > self.max_retry_wait:
+                return response  # telebot поднимет ApiTelegramException
+            _rewind_files(kwargs.get("files"))
+
+
+def _rewind_files(files: dict | None):
+    """Файлы уже прочитаны первой попыткой - перематываем для повтора"""
+
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, tuple) else value
+        if hasattr(file, "seek"):
+            file.seek(0)
@@ -0,0 +1,78 @@
+"""Анализ по уменьшенной копии (`analysis_scale`) даёт ту же обрезку, что и полный"""
+
+import cv2
+import numpy as np
+import pytest
+
+import image_processing as imp
+from utils.synthetic_screens import encode, iter_cases
+
+CASES = [(name, encode(img)) for name, img in iter_cases()]
+"""Синтетические скриншоты в JPEG, как их присылает Telegram"""
+
+SCALES = [2, 4]
+
+
+def _noisy(img: np.ndarray, amplitude: int, seed: int = 0) -> np.ndarray:
+    """Равномерный шум 0..`amplitude`: тёмный фон и панель перестают быть ровно чёрными"""
+
+    rng = np.random.default_rng(seed)
+    return cv2.add(img, rng.integers(0, amplitude + 1, img.shape, dtype=np.uint8))
+
+
+def _recompressed(img: np.ndarray, quality: int) -> np.ndarray:
+    """Сильное сжатие JPEG: артефакты у краёв содержимого"""
+
+    _, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+NOISY_CASES = [
+    (f"{name}_{kind}", image)
+    for name, img in iter_cases()
+    for kind, image in [
+        ("noise40", _noisy(img, 40)),
+        ("jpeg40", _recompressed(img, 40)),
+    ]
+]
+"""Те же скриншоты с шумом и артефактами сжатия"""
+
+
+@pytest.fixture(autouse=True)
+def no_geometry_cache(monkeypatch):
+    monkeypatch.setattr(imp, "geometry_cache", None)  # каждый раз полный анализ
+
+
+def _decode(data: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+@pytest.mark.parametrize("analysis_scale", SCALES)
+@pytest.mark.parametrize("data", [data for _, data in CASES], ids=[name for name, _ in CASES])
+def test_scaled_analysis_gives_same_crop(data: bytes, analysis_scale: int):
+    img = _decode(data)
+    assert imp._find_crop_geometry(img, analysis_scale) == imp._find_crop_geometry(img)
+
+    # PNG без потерь: одинаковые байты - одинаковая рамка обрезки
+    full = imp.create_cropped_image_bytes(data, ext=".png")
+    scaled = imp.create_cropped_image_bytes(data, ext=".png", analysis_scale=analysis_scale)
+    assert scaled == full
+
+
+@pytest.mark.parametrize("analysis_scale", SCALES)
+@pytest.mark.parametrize(
+    "img", [img for _, img in NOISY_CASES], ids=[name for name, _ in NOISY_CASES]
+)
+def test_scaled_analysis_on_noisy_input(img: np.ndarray, analysis_scale: int):
+    assert imp._find_crop_geometry(img, analysis_scale) == imp._find_crop_geometry(img)
+
+
+@pytest.mark.parametrize("analysis_scale", [1, *SCALES])
+def test_batch_matches_single(analysis_scale: int):
+    by_shape: dict[tuple[int, ...], list[np.ndarray]] = {}
+    for img in [_decode(data) for _, data in CASES] + [img for _, img in NOISY_CASES]:
+        by_shape.setdefault(img.shape, []).append(img)
+
+    for images in by_shape.values():
+        expected = [imp._find_crop_geometry(img) for img in images]
+        assert imp._find_crop_geometry_batch(images, analysis_scale) == expected
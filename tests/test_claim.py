@@ -0,0 +1,156 @@
+"""Отправка из очереди: захват файлов (claim), подтверждение, возврат и восстановление"""
+
+import os
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import bot_actions
+import handlers
+from channels import MAIN_CHANNEL, Channel, ChannelConfig
+from utils.persist_state import State
+
+
+@pytest.fixture
+def channel(tmp_path: Path) -> Channel:
+    state = State(data_path=tmp_path / "state.json", watch=False)
+    return Channel(
+        ChannelConfig(MAIN_CHANNEL, -100), tmp_path / "queue", tmp_path / "inflight", "*.jpg", state
+    )
+
+
+def _fill(channel: Channel, count: int) -> list[Path]:
+    files = []
+    for i in range(count):
+        path = Path(channel.queue_dir, f"{i:03}.jpg")
+        path.write_bytes(f"image {i}".encode())
+        os.utime(path, ns=(10**18 + i, 10**18 + i))
+        channel.queue_index.add(path)
+        files.append(path)
+    return files
+
+
+def _queue_names(channel: Channel) -> list[str]:
+    return sorted(p.name for p in channel.queue_dir.glob("*.jpg"))
+
+
+def test_claim_takes_oldest(channel: Channel):
+    _fill(channel, 5)
+
+    claimed = bot_actions.claim_queue_images(channel, 2, "s1")
+
+    assert [p.name for p in claimed] == ["000.jpg", "001.jpg"]
+    assert all(p.parent == Path(channel.inflight_dir, "s1") for p in claimed)
+    assert _queue_names(channel) == ["002.jpg", "003.jpg", "004.jpg"]
+    assert channel.queue_index.count() == 3
+
+
+def test_concurrent_claims_never_share_files(channel: Channel):
+    _fill(channel, 60)
+    barrier = threading.Barrier(6)
+    results: dict[int, list[Path]] = {}
+
+    def sender(n: int):
+        barrier.wait()
+        claimed = []
+        while batch := bot_actions.claim_queue_images(channel, 3, f"s{n}"):
+            claimed += batch
+        results[n] = claimed
+
+    threads = [threading.Thread(target=sender, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    names = [p.name for claimed in results.values() for p in claimed]
+    assert sorted(names) == [f"{i:03}.jpg" for i in range(60)]  # каждый файл - ровно один раз
+    assert all(p.exists() for claimed in results.values() for p in claimed)
+    assert channel.queue_index.count() == 0
+
+
+def test_commit_and_release(channel: Channel):
+    files = _fill(channel, 3)
+    mtimes = {p.name: p.stat().st_mtime_ns for p in files}
+
+    sent = bot_actions.claim_queue_images(channel, 1, "s1")
+    failed = bot_actions.claim_queue_images(channel, 1, "s1")
+    bot_actions.commit_claimed(sent)
+    bot_actions.release_claimed(channel, failed)
+
+    assert not sent[0].exists()
+    assert _queue_names(channel) == ["001.jpg", "002.jpg"]
+    # возвращённый файл - снова первый в очереди (время изменения сохранилось)
+    assert [p.name for p in channel.queue_index.oldest(2)] == ["001.jpg", "002.jpg"]
+    assert Path(channel.queue_dir, "001.jpg").stat().st_mtime_ns == mtimes["001.jpg"]
+
+
+class _FailingBot:
+    def send_photo(self, **_):
+        raise ConnectionError("сеть недоступна")
+
+    def send_media_group(self, **_):
+        raise ConnectionError("сеть недоступна")
+
+
+class _Bot:
+    def __init__(self) -> None:
+        self.sent: list[int] = []
+
+    def send_photo(self, **_):
+        self.sent.append(1)
+
+    def send_media_group(self, media, **_):
+        self.sent.append(len(media))
+
+
+def _envs(channel: Channel, bot) -> SimpleNamespace:
+    return SimpleNamespace(
+        BOT=bot, STATE=SimpleNamespace(read_timeout=1), CHANNELS={channel.name: channel}
+    )
+
+
+def test_send_failure_returns_files_to_queue(channel: Channel):
+    _fill(channel, 3)
+
+    with pytest.raises(ConnectionError):
+        handlers.send_queue_to_channel(_envs(channel, _FailingBot()), channel, count=2)
+
+    assert _queue_names(channel) == ["000.jpg", "001.jpg", "002.jpg"]
+    assert [p.name for p in channel.queue_index.oldest(3)] == ["000.jpg", "001.jpg", "002.jpg"]
+    assert not list(channel.inflight_dir.rglob("*.jpg"))
+
+
+def test_send_success_deletes_files(channel: Channel):
+    _fill(channel, 3)
+    bot = _Bot()
+
+    assert handlers.send_queue_to_channel(_envs(channel, bot), channel, count=2).startswith(
+        "Отправлено"
+    )
+    assert bot.sent == [2]
+    assert _queue_names(channel) == ["002.jpg"]
+    assert not list(channel.inflight_dir.rglob("*.jpg"))
+
+
+def test_recover_inflight_after_crash(channel: Channel):
+    _fill(channel, 4)
+    bot_actions.claim_queue_images(channel, 2, "s1")
+    bot_actions.claim_queue_images(channel, 1, "s2")
+    assert _queue_names(channel) == ["003.jpg"]
+
+    # перезапуск: новый индекс, файлы из папок отправителей возвращаются в очередь
+    channel.queue_index.rescan()
+    envs = SimpleNamespace(CHANNELS={channel.name: channel}, IMAGES_GLOB_PATTERN="*.jpg")
+    bot_actions.recover_inflight(envs)
+
+    assert _queue_names(channel) == ["000.jpg", "001.jpg", "002.jpg", "003.jpg"]
+    assert [p.name for p in channel.queue_index.oldest(4)] == [
+        "000.jpg",
+        "001.jpg",
+        "002.jpg",
+        "003.jpg",
+    ]
+    assert not list(channel.inflight_dir.rglob("*.jpg"))
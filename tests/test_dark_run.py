@@ -0,0 +1,52 @@
+"""Векторный `_find_bottom_dark_run` совпадает с прежним циклом по строкам"""
+
+import numpy as np
+import pytest
+
+import image_processing as imp
+
+
+def _reference_dark_run(is_dark: np.ndarray, min_height: int) -> int | None:
+    """Прежний поиск тёмной области снизу (цикл из `_remove_navigation_bar`)"""
+
+    consecutive_dark = 0
+    for i in range(len(is_dark) - 1, -1, -1):
+        if is_dark[i]:
+            consecutive_dark += 1
+        elif consecutive_dark >= min_height:
+            return i + 1
+        else:
+            consecutive_dark = 0
+
+    if consecutive_dark >= min_height:
+        return 0
+    return None
+
+
+@pytest.mark.parametrize("dark_share", [0.1, 0.5, 0.8, 0.95])
+@pytest.mark.parametrize("min_height", [0, 1, 3, 10])
+def test_matches_reference_loop(dark_share: float, min_height: int):
+    rng = np.random.default_rng(min_height * 100 + int(dark_share * 100))
+    for _ in range(300):
+        is_dark = rng.random(rng.integers(0, 60)) < dark_share
+        expected = _reference_dark_run(is_dark, min_height)
+        assert imp._find_bottom_dark_run(is_dark, min_height) == expected, is_dark.tolist()
+
+
+@pytest.mark.parametrize(
+    "rows, min_height, expected",
+    [
+        ([], 1, None),
+        ([], 0, 0),
+        ([True] * 5, 5, 0),
+        ([True] * 4, 5, None),
+        ([False, True, True, True], 3, 1),
+        ([True, True, False, True], 2, 0),
+        ([False, True, True, False, True], 2, 1),
+        ([False, False, False], 0, 3),
+    ],
+)
+def test_edge_cases(rows: list[bool], min_height: int, expected: int | None):
+    is_dark = np.array(rows, dtype=bool)
+    assert _reference_dark_run(is_dark, min_height) == expected
+    assert imp._find_bottom_dark_run(is_dark, min_height) == expected
@@ -0,0 +1,72 @@
+"""Подробный лог обрезки: только внутри `debug_scope` и только для своего потока"""
+
+import logging
+import threading
+
+import pytest
+
+import image_processing as imp
+
+
+class _Records(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def records():
+    handler = _Records()
+    imp.crop_logger.addHandler(handler)
+    imp.crop_logger.setLevel(logging.INFO)  # как настроил оператор
+    yield handler
+    imp.crop_logger.removeHandler(handler)
+    imp.crop_logger.setLevel(logging.NOTSET)
+
+
+def test_configured_level_outside_scope(records: _Records):
+    imp.crop_logger.debug("вне блока")
+    imp.crop_logger.info("info")
+
+    assert not imp._debug_enabled()
+    assert not imp.crop_logger.isEnabledFor(logging.DEBUG)
+    assert records.messages == ["info"]
+
+
+def test_scope_raises_level_and_restores(records: _Records):
+    with imp.debug_scope():
+        assert imp._debug_enabled()
+        with imp.debug_scope():  # вложенный блок ничего не меняет
+            imp.crop_logger.debug("внутри")
+        assert imp.crop_logger.isEnabledFor(logging.DEBUG)
+
+    with imp.debug_scope(False):
+        assert not imp._debug_enabled()
+        imp.crop_logger.debug("выключено")
+
+    assert imp.crop_logger.level == logging.INFO
+    assert records.messages == ["внутри"]
+
+
+def test_scope_is_per_thread(records: _Records):
+    inside, done = threading.Event(), threading.Event()
+
+    def debug_thread():
+        with imp.debug_scope():
+            imp.crop_logger.debug("отладка")
+            inside.set()
+            done.wait(2)
+
+    thread = threading.Thread(target=debug_thread)
+    thread.start()
+    assert inside.wait(2)
+    imp.crop_logger.debug("другой поток")  # уровень понижен, но запись отсекает фильтр
+    assert not imp._debug_enabled()
+    done.set()
+    thread.join(2)
+
+    assert records.messages == ["отладка"]
+    assert imp.crop_logger.level == logging.INFO
@@ -0,0 +1,86 @@
+"""Скачивание файлов: продолжение оборванной загрузки (`Range`) и повторы"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+from telebot import apihelper
+
+import file_downloader
+from file_downloader import DownloadError, FileDownloader
+from utils.fake_bot_api import FakeBotApi
+
+DATA = os.urandom(300 * 2**10)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    result = FakeBotApi().start()
+    monkeypatch.setattr(apihelper, "FILE_URL", result.file_url)
+    monkeypatch.setattr(file_downloader, "time", SimpleNamespace(sleep=lambda _: None))
+    yield result
+    result.shutdown()
+
+
+@pytest.fixture
+def downloader():
+    result = FileDownloader("123:token", chunk_size=4 * 2**10, timeout=(5, 5))
+    yield result
+    result.shutdown()
+
+
+def _file_path(api: FakeBotApi, data: bytes = DATA) -> str:
+    return f"photos/{api.add_file(data)['file_id']}.jpg"
+
+
+def _ranges(api: FakeBotApi) -> list[str]:
+    return [call.params["Range"] for call in api.calls_of("file")]
+
+
+def test_download(api: FakeBotApi, downloader: FileDownloader):
+    assert downloader.download_bytes(_file_path(api)) == DATA
+    assert _ranges(api) == [""]
+
+
+def test_resume_after_cut(api: FakeBotApi, downloader: FileDownloader):
+    api.cut_downloads = 2  # два обрыва подряд, каждый раз на середине остатка
+    path = _file_path(api)
+
+    assert downloader.download_bytes(path) == DATA
+
+    ranges = _ranges(api)
+    assert len(ranges) == 3
+    assert ranges[0] == ""
+    offsets = [int(value.removeprefix("bytes=").rstrip("-")) for value in ranges[1:]]
+    assert 0 < offsets[0] < offsets[1] < len(DATA)  # каждый раз - с места обрыва
+
+
+def test_resume_to_file(api: FakeBotApi, downloader: FileDownloader, tmp_path):
+    api.cut_downloads = 1
+    dest = tmp_path / "image.jpg"
+
+    downloader.download_to_file(_file_path(api), dest)
+
+    assert dest.read_bytes() == DATA
+    assert list(tmp_path.iterdir()) == [dest]  # временных файлов не осталось
+
+
+def test_restart_without_range_support(api: FakeBotApi, downloader: FileDownloader):
+    api.cut_downloads = 1
+    api.range_support = False  # сервер отдаёт файл целиком (200) - пишем заново
+
+    assert downloader.download_bytes(_file_path(api)) == DATA
+    assert len(_ranges(api)) == 2
+
+
+def test_too_many_cuts(api: FakeBotApi, downloader: FileDownloader):
+    api.cut_downloads = downloader.retries + 1
+
+    with pytest.raises(DownloadError):
+        downloader.download_bytes(_file_path(api))
+    assert len(_ranges(api)) == downloader.retries + 1
+
+
+def test_missing_file(api: FakeBotApi, downloader: FileDownloader):
+    with pytest.raises(DownloadError, match="404"):
+        downloader.download_bytes("photos/unknown.jpg")
@@ -0,0 +1,57 @@
+"""Справка (/help): все настроенные каналы и отметка канала для новых картинок"""
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+import bot_actions
+from channels import MAIN_CHANNEL, Channel, ChannelConfig
+from utils.persist_state import State
+
+CHATS = {
+    -100: SimpleNamespace(title="Основной", invite_link="https://t.me/+main"),
+    -200: SimpleNamespace(title="Art & <Memes>", invite_link=None),
+}
+
+
+class _Bot:
+    def get_chat(self, chat_id: int):
+        if chat_id not in CHATS:
+            raise ApiTelegramException("getChat", None, {"error_code": 400, "description": "-"})
+        return CHATS[chat_id]
+
+
+@pytest.fixture
+def envs(tmp_path: Path) -> SimpleNamespace:
+    state = State(data_path=tmp_path / "state.json", watch=False)
+    channels = {
+        config.name: Channel(config, tmp_path / "queue", tmp_path / "inflight", "*.jpg", state)
+        for config in [
+            ChannelConfig(MAIN_CHANNEL, -100),
+            ChannelConfig("art", -200),
+            ChannelConfig("lost", -300),
+        ]
+    }
+    return SimpleNamespace(BOT=_Bot(), STATE=state, CHANNELS=channels)
+
+
+def _channel_lines(text: str) -> list[str]:
+    return [line for line in text.splitlines() if line.endswith("</code>)")]
+
+
+def test_lists_all_channels(envs: SimpleNamespace):
+    assert _channel_lines(bot_actions.get_help(envs)) == [
+        '➡️ <a href="https://t.me/+main">Основной</a> (<code>main</code>)',
+        "Art &amp; &lt;Memes&gt; (<code>art</code>)",
+        "-300 (<code>lost</code>)",  # бот не видит канал - справка всё равно выводится
+    ]
+
+
+def test_marks_target_channel(envs: SimpleNamespace):
+    bot_actions.set_target_channel(envs, "art")
+
+    lines = _channel_lines(bot_actions.get_help(envs))
+
+    assert [line.startswith("➡️") for line in lines] == [False, True, False]
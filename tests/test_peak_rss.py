@@ -0,0 +1,34 @@
+"""Пиковый RSS в логе - за время блока, а не за всё время жизни процесса"""
+
+import logging
+import mmap
+import time
+
+import numpy as np
+
+import resource_governor
+from resource_governor import log_peak_rss
+
+
+def _logged(caplog) -> tuple[int, int, int]:
+    """RSS до, после и пик (МБ) из последней записи `log_peak_rss`"""
+
+    record = [r for r in caplog.records if r.name == resource_governor.logger.name][-1]
+    _, before, after, peak = record.args
+    return before, after, peak
+
+
+def test_peak_is_per_block(caplog):
+    caplog.set_level(logging.INFO, logger=resource_governor.logger.name)
+
+    # новые страницы (куча процесса может уже держать освобождённую память)
+    with log_peak_rss("большое"), mmap.mmap(-1, 200 * 2**20) as buffer:
+        np.frombuffer(buffer, dtype=np.uint8)[:] = 1
+        time.sleep(0.05)
+    before, after, peak = _logged(caplog)
+    assert peak - max(before, after) >= 150
+
+    with log_peak_rss("маленькое"):
+        time.sleep(0.05)
+    before, after, peak = _logged(caplog)
+    assert peak - max(before, after) < 50  # пик предыдущего блока не учитывается
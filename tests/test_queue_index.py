@@ -0,0 +1,104 @@
+"""Индекс очереди: порядок по времени изменения, обновления из бота и извне (watchdog)"""
+
+import os
+import shutil
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from queue_index import QueueIndex
+
+
+def _make(path: Path, mtime: int) -> Path:
+    path.write_bytes(b"jpg")
+    os.utime(path, ns=(mtime * 10**9, mtime * 10**9))
+    return path
+
+
+def _wait_until(predicate: Callable[[], bool], timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture
+def queue_dir(tmp_path: Path) -> Path:
+    path = tmp_path / "queue"
+    path.mkdir()
+    return path
+
+
+def test_oldest_first(queue_dir: Path):
+    for name, mtime in [("c.jpg", 300), ("a.jpg", 100), ("b.jpg", 200)]:
+        _make(queue_dir / name, mtime)
+    _make(queue_dir / "skip.png", 50)  # не подходит под паттерн
+
+    index = QueueIndex(queue_dir, "*.jpg")
+
+    assert index.count() == 3
+    assert [p.name for p in index.oldest(2)] == ["a.jpg", "b.jpg"]
+    assert [p.name for p in index.oldest(10)] == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_oldest_keeps_entries(queue_dir: Path):
+    """`oldest` достаёт записи из кучи и возвращает их обратно"""
+
+    for i in range(5):
+        _make(queue_dir / f"{i}.jpg", 100 + i)
+    index = QueueIndex(queue_dir)
+
+    first = index.oldest(3)
+    assert index.oldest(3) == first
+    assert index.count() == 5
+    assert [p.name for p in index.oldest(5)] == [f"{i}.jpg" for i in range(5)]
+
+
+def test_add_discard_and_stale_entries(queue_dir: Path):
+    a = _make(queue_dir / "a.jpg", 100)
+    b = _make(queue_dir / "b.jpg", 200)
+    index = QueueIndex(queue_dir)
+    changes = []
+    index.add_listener(lambda: changes.append(index.count()))
+
+    # файл изменён: старая запись кучи устарела, файл - в конце очереди
+    _make(a, 300)
+    index.add(a)
+    assert [p.name for p in index.oldest(2)] == ["b.jpg", "a.jpg"]
+
+    index.add(a)  # то же время изменения - без изменений
+    index.discard(b)
+    index.discard(b)  # уже удалён - без уведомления
+    assert [p.name for p in index.oldest(2)] == ["a.jpg"]
+
+    c = queue_dir / "c.jpg"
+    index.add(c)  # файла нет - не добавляется
+    _make(c, 50)
+    index.add(c)
+    assert [p.name for p in index.oldest(3)] == ["c.jpg", "a.jpg"]
+    assert changes == [2, 1, 2]
+
+
+def test_watchdog_tracks_external_changes(queue_dir: Path, tmp_path: Path):
+    _make(queue_dir / "a.jpg", 100)
+    index = QueueIndex(queue_dir)
+    index.start_watching()
+    try:
+        _make(queue_dir / "b.jpg", 200)  # создан извне (например, bulk_import.py)
+        assert _wait_until(lambda: index.count() == 2)
+
+        outside = _make(tmp_path / "c.jpg", 50)
+        shutil.move(outside, queue_dir / "c.jpg")  # перемещён в очередь
+        assert _wait_until(lambda: index.count() == 3)
+        assert [p.name for p in index.oldest(1)] == ["c.jpg"]
+
+        (queue_dir / "a.jpg").unlink()
+        (queue_dir / "b.jpg").rename(queue_dir / "b.jpg.tmp")  # ушёл из-под паттерна
+        assert _wait_until(lambda: index.count() == 1)
+        assert [p.name for p in index.oldest(5)] == ["c.jpg"]
+    finally:
+        index.stop_watching()
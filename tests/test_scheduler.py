@@ -0,0 +1,124 @@
+"""Планировщик: срабатывание задач по сроку, ежедневные повторы, отмена и ожидание"""
+
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import pytz
+
+import scheduler as scheduler_module
+from scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler() -> Scheduler:
+    result = Scheduler()
+    threading.Thread(target=result.run_forever, daemon=True).start()
+    return result
+
+
+def test_call_at_fires_in_order(scheduler: Scheduler):
+    fired = []
+    done = threading.Event()
+    now = time.time()
+    scheduler.call_at(now + 0.10, fired.append, "second")
+    scheduler.call_at(now + 0.05, fired.append, "first")
+    scheduler.call_at(now + 0.10, fired.append, "third")  # тот же срок - по порядку
+    scheduler.call_later(0.15, done.set)
+
+    assert done.wait(2)
+    assert fired == ["first", "second", "third"]
+
+
+def test_call_later_fires_not_before_deadline(scheduler: Scheduler):
+    fired_at = []
+    done = threading.Event()
+    started = time.monotonic()
+    scheduler.call_later(0.2, lambda: (fired_at.append(time.monotonic()), done.set()))
+
+    assert done.wait(2)
+    assert fired_at[0] - started >= 0.19
+
+
+def test_cancel(scheduler: Scheduler):
+    fired = []
+    done = threading.Event()
+    timer_id = scheduler.call_later(0.05, fired.append, "cancelled")
+    scheduler.call_later(0.05, fired.append, "kept")
+    scheduler.cancel(timer_id)
+    scheduler.call_later(0.1, done.set)
+
+    assert done.wait(2)
+    assert fired == ["kept"]
+
+
+def test_errors_do_not_stop_scheduler(scheduler: Scheduler):
+    done = threading.Event()
+    scheduler.call_later(0.01, lambda: 1 / 0)
+    scheduler.call_later(0.02, done.set)
+    assert done.wait(2)
+
+
+def test_every_day_at_repeats_until_cancelled(scheduler: Scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "_next_daily", lambda at, tz: time.time() + 0.02)
+    calls = []
+    enough = threading.Event()
+
+    def job(arg):
+        calls.append(arg)
+        if len(calls) >= 3:
+            enough.set()
+
+    timer_id = scheduler.every_day_at("12:00", "Europe/Moscow", job, "x")
+    assert enough.wait(2)
+    scheduler.cancel(timer_id)
+    count = len(calls)
+    time.sleep(0.2)
+
+    assert calls[:3] == ["x", "x", "x"]
+    assert len(calls) <= count + 1  # повтор мог уже выполняться во время отмены
+
+
+def test_cancel_during_daily_run(scheduler: Scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "_next_daily", lambda at, tz: time.time() + 0.02)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def job():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+
+    timer_id = scheduler.every_day_at("12:00", "Europe/Moscow", job)
+    assert started.wait(2)
+    scheduler.cancel(timer_id)  # задача сейчас выполняется - повтор не планируется
+    release.set()
+    time.sleep(0.2)
+
+    assert calls == [1]
+
+
+def test_next_daily():
+    zone = pytz.timezone("Europe/Moscow")
+    now = time.time()
+    moment = datetime.fromtimestamp(scheduler_module._next_daily("12:30", "Europe/Moscow"), zone)
+
+    assert (moment.hour, moment.minute, moment.second) == (12, 30, 0)
+    assert now < moment.timestamp() <= now + 24 * 3600
+
+
+def test_wait_for_wakes_on_notify():
+    scheduler = Scheduler()
+    state = {"ready": False}
+
+    def make_ready():
+        time.sleep(0.05)
+        state["ready"] = True
+        scheduler.notify()
+
+    threading.Thread(target=make_ready, daemon=True).start()
+    started = time.monotonic()
+    assert scheduler.wait_for(lambda: state["ready"], timeout=2)
+    assert time.monotonic() - started < 1
+    assert not scheduler.wait_for(lambda: False, timeout=0.05)
@@ -0,0 +1,115 @@
+"""Состояние с отложенной записью: объединение записей, перечитывание при изменении извне"""
+
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from utils.files import atomic_write_bytes
+from utils.persist_state import State
+from utils.persist_state import cached as cached_module
+
+
+def _wait_until(predicate: Callable[[], bool], timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def _read(path: Path) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _read_or_none(path: Path) -> int | None:
+    try:
+        return _read(path).get("state_number_of_messages_to_send")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+@pytest.fixture
+def writes(monkeypatch) -> list[Path]:
+    """Пути всех записей файла состояния"""
+
+    result = []
+
+    def counting_write(path, data):
+        result.append(Path(path))
+        atomic_write_bytes(path, data)
+
+    monkeypatch.setattr(cached_module, "atomic_write_bytes", counting_write)
+    return result
+
+
+def test_changes_are_coalesced(tmp_path: Path, writes: list[Path]):
+    path = tmp_path / "state.json"
+    state = State(data_path=path, flush_interval=0.2, watch=False)
+
+    for i in range(1, 21):
+        state.state_number_of_messages_to_send = i
+    state.state_channel_budgets = {"extra": 3}
+    assert not path.exists()  # запись отложена
+
+    assert _wait_until(lambda: len(writes) > 0)
+    time.sleep(0.4)
+    assert writes == [path]
+    assert _read(path) == {
+        "state_number_of_messages_to_send": 20,
+        "state_channel_budgets": {"extra": 3},
+    }
+
+    state._flush()  # изменений нет - записи нет
+    assert len(writes) == 1
+
+
+def test_explicit_flush(tmp_path: Path, writes: list[Path]):
+    path = tmp_path / "state.json"
+    state = State(data_path=path, flush_interval=60, watch=False)
+
+    state.state_target_channel = "extra"
+    state._flush()
+
+    assert writes == [path]
+    assert _read(path) == {"state_target_channel": "extra"}
+    assert State(data_path=path, watch=False).state_target_channel == "extra"
+
+
+def test_reload_on_external_edit(tmp_path: Path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({"read_timeout": 10}), encoding="utf-8")
+    state = State(data_path=path, flush_interval=0.05)
+    changes = []
+    state._add_listener(lambda: changes.append(state.read_timeout))
+    try:
+        assert state.read_timeout == 10
+
+        # файл правят руками (или другим процессом)
+        atomic_write_bytes(path, json.dumps({"read_timeout": 25}).encode())
+
+        assert _wait_until(lambda: state.read_timeout == 25)
+        assert _wait_until(lambda: 25 in changes)
+    finally:
+        state._observer.stop()
+
+
+def test_own_writes_are_not_reloaded(tmp_path: Path, monkeypatch):
+    path = tmp_path / "state.json"
+    state = State(data_path=path, flush_interval=0.05)
+    reloads = []
+    reload = state._reload
+    monkeypatch.setattr(state, "_reload", lambda: (reloads.append(1), reload()))
+    try:
+        for i in range(5):
+            state.state_number_of_messages_to_send = i
+            assert _wait_until(lambda i=i: _read_or_none(path) == i)
+        time.sleep(0.3)  # события watchdog о собственных записях
+
+        assert reloads == []
+        assert state.state_number_of_messages_to_send == 4
+    finally:
+        state._observer.stop()
@@ -0,0 +1,167 @@
+"""Лимитер Bot API: повторы после 429, пределы повторов и очередь по приоритетам.
+
+Время - поддельное: ожидание лимитера (`Condition.wait`) просто сдвигает часы.
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import telegram_limiter
+from telegram_limiter import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, TelegramRateLimiter
+
+URL = "https://api.telegram.org/bot123:token/"
+CHANNEL = "-100"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class _Condition(threading.Condition):
+    """Ожидание не блокирует поток, а сдвигает поддельные часы"""
+
+    def __init__(self, clock: _Clock) -> None:
+        super().__init__()
+        self._clock = clock
+
+    def wait(self, timeout: float | None = None) -> bool:
+        self._clock.now += timeout or 0
+        return False
+
+
+class _Response:
+    def __init__(self, status_code: int, retry_after: float | None = None) -> None:
+        self.status_code = status_code
+        self._retry_after = retry_after
+
+    def json(self) -> dict:
+        if self._retry_after is None:
+            raise ValueError("не JSON")
+        return {"ok": False, "parameters": {"retry_after": self._retry_after}}
+
+
+class _Sender:
+    """Отвечает заранее заданными ответами и запоминает время каждого запроса"""
+
+    def __init__(self, clock: _Clock, responses: list[_Response]) -> None:
+        self._clock = clock
+        self._responses = responses
+        self.times: list[float] = []
+
+    def request(self, method: str, url: str, **kwargs) -> _Response:
+        self.times.append(self._clock.now - 1000)
+        return self._responses.pop(0) if self._responses else _Response(200)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    result = _Clock()
+    monkeypatch.setattr(telegram_limiter, "time", SimpleNamespace(monotonic=result.monotonic))
+    return result
+
+
+def _limiter(clock: _Clock, sender: _Sender | None = None, **kwargs) -> TelegramRateLimiter:
+    limiter = TelegramRateLimiter(**kwargs)
+    limiter._cond = _Condition(clock)
+    if sender:
+        limiter._session = lambda: sender
+    return limiter
+
+
+def _send(limiter: TelegramRateLimiter, method: str = "sendPhoto", chat: str | None = CHANNEL):
+    params = {"chat_id": chat} if chat is not None else {}
+    return limiter.request("post", URL + method, params=params)
+
+
+def test_retry_after_blocks_chat_and_retries(clock: _Clock):
+    sender = _Sender(clock, [_Response(429, retry_after=5)])
+    limiter = _limiter(clock, sender, group_rate=100)
+
+    assert _send(limiter).status_code == 200
+    assert sender.times == [0, 5]
+    assert limiter._blocked_until == {CHANNEL: 1005}
+
+
+def test_retry_without_retry_after_backs_off(clock: _Clock):
+    sender = _Sender(clock, [_Response(429), _Response(429), _Response(429)])
+    limiter = _limiter(clock, sender, group_rate=100)
+
+    assert _send(limiter).status_code == 200
+    assert sender.times == [0, 1, 3, 7]
+
+
+def test_max_retries(clock: _Clock):
+    sender = _Sender(clock, [_Response(429, retry_after=1) for _ in range(10)])
+    limiter = _limiter(clock, sender, group_rate=100, max_retries=2)
+
+    assert _send(limiter).status_code == 429  # telebot поднимет ApiTelegramException
+    assert sender.times == [0, 1, 2]
+
+
+def test_max_retry_wait(clock: _Clock):
+    sender = _Sender(clock, [_Response(429, retry_after=120)])
+    limiter = _limiter(clock, sender, max_retry_wait=60)
+
+    assert _send(limiter).status_code == 429  # ждать слишком долго - не повторяем
+    assert sender.times == [0]
+
+    # блокировка осталась: следующий запрос в этот чат ждёт её окончания
+    assert _send(limiter).status_code == 200
+    assert sender.times == [0, 120]
+
+
+def test_retry_after_without_chat_blocks_bot(clock: _Clock):
+    sender = _Sender(clock, [_Response(429, retry_after=3)])
+    limiter = _limiter(clock, sender)
+
+    _send(limiter, "getUpdates", chat=None)
+    limiter.acquire("sendMessage", "42")  # другой чат тоже ждёт
+
+    assert sender.times == [0, 3]
+    assert clock.now == 1003
+
+
+def test_ready_before_counts_only_ready_waiters(clock: _Clock):
+    limiter = _limiter(clock, priority_chats=[CHANNEL])
+    limiter._waiting[PRIORITY_HIGH] = {CHANNEL: 3, "-200": 1}
+    limiter._waiting[PRIORITY_NORMAL] = {None: 2}
+
+    # в ведре канала один токен: сразу отправит только один из трёх
+    assert limiter._ready_before(PRIORITY_NORMAL, clock.now) == 2
+    assert limiter._ready_before(PRIORITY_LOW, clock.now) == 4
+    assert limiter._ready_before(PRIORITY_HIGH, clock.now) == 0
+
+    limiter.block(CHANNEL, 10)  # ожидающие разблокировки не мешают
+    assert limiter._ready_before(PRIORITY_NORMAL, clock.now) == 1
+
+    limiter._chat_bucket("-200").take(clock.now)  # ждущие токена своего чата - тоже
+    assert limiter._ready_before(PRIORITY_NORMAL, clock.now) == 0
+
+
+def test_global_tokens_reserved_for_higher_priority(clock: _Clock):
+    limiter = _limiter(clock, global_rate=2, priority_chats=[CHANNEL])
+    limiter.acquire("sendMessage", "42")
+    limiter.acquire("sendMessage", "43")  # общее ведро пусто
+    limiter._waiting[PRIORITY_HIGH] = {CHANNEL: 1}  # пост в канал готов к отправке
+
+    limiter.acquire("editMessageText", "44")
+
+    # без резерва статус ушёл бы через 0.5 сек., но первый токен оставлен посту в канал
+    assert clock.now == 1001
+
+
+def test_unlimited_methods_skip_buckets(clock: _Clock):
+    limiter = _limiter(clock, global_rate=1)
+    limiter.acquire("sendMessage", "42")
+
+    for _ in range(5):
+        limiter.acquire("getUpdates", None)
+
+    assert clock.now == 1000
+    assert limiter._waiting == [{}, {}, {}]
@@ -0,0 +1,87 @@
+"""Webhook: приём сохранённого обновления, проверка секрета и разбор тела"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from telebot import TeleBot
+
+from webhook_server import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret"
+
+UPDATE = {
+    "update_id": 10,
+    "message": {
+        "message_id": 5,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "admin"},
+        "text": "/help",
+    },
+}
+"""Обновление в том виде, в каком его присылает Telegram"""
+
+
+@pytest.fixture
+def received() -> list[str]:
+    return []
+
+
+@pytest.fixture
+def webhook(received: list[str]):
+    bot = TeleBot("123:token", threaded=False)  # обработчики - в потоке запроса
+    bot.message_handler(func=lambda _: True)(lambda message: received.append(message.text))
+
+    server = WebhookServer(bot, port=0, secret_token=SECRET)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def _post(server: WebhookServer, body: bytes, secret: str | None = SECRET, path="/webhook") -> int:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.server_port}{path}", data=body, method="POST"
+    )
+    if secret is not None:
+        request.add_header(SECRET_HEADER, secret)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as ex:
+        return ex.code
+
+
+def test_update_is_processed(webhook: WebhookServer, received: list[str]):
+    assert _post(webhook, json.dumps(UPDATE).encode()) == 200
+
+    # ответ уходит до обработки
+    deadline = time.monotonic() + 5
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert received == ["/help"]
+    assert (webhook.received, webhook.rejected) == (1, 0)
+
+
+@pytest.mark.parametrize("secret", ["wrong", "", None])
+def test_wrong_secret(webhook: WebhookServer, received: list[str], secret: str | None):
+    assert _post(webhook, json.dumps(UPDATE).encode(), secret=secret) == 403
+    assert received == []
+    assert (webhook.received, webhook.rejected) == (0, 1)
+
+
+@pytest.mark.parametrize(
+    "body", [b"not json", b"[1, 2]", json.dumps({"message": UPDATE["message"]}).encode()]
+)
+def test_malformed_body(webhook: WebhookServer, received: list[str], body: bytes):
+    assert _post(webhook, body) == 400
+    assert received == []
+    assert webhook.received == 0
+
+
+def test_wrong_path(webhook: WebhookServer):
+    assert _post(webhook, json.dumps(UPDATE).encode(), path="/other") == 404
+    assert webhook.received == 0
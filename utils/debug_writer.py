@@ -0,0 +1,109 @@
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:  # cv2 и numpy загружаются только при записи (см. `_write`)
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEBUG_PREFIX = "debug_"
+"""Начало имени отладочных файлов (по нему работает очистка)"""
+
+
+class DebugRetention(NamedTuple):
+    """Сколько отладочных файлов хранить в папке (передаётся и в процессы пула)"""
+
+    keep_files: int = 200
+    max_bytes: int = 200 * 2**20
+    max_queue: int = 8
+    """Сколько изображений может ждать записи, лишние отбрасываются"""
+
+
+class DebugWriter:
+    """Фоновая запись отладочных изображений (рамка обрезки поверх исходника).
+
+    В пути обрезки остаётся только постановка в очередь без копирования кадра:
+    копия, рисование и `imwrite` выполняются в отдельном потоке. Если очередь
+    заполнена - изображение отбрасывается, обработка не ждёт.
+
+    После каждой записи в папке файла остаются только последние
+    `keep_files` файлов `debug_*` общим размером не больше `max_bytes`.
+    """
+
+    def __init__(self, retention: DebugRetention | None = None) -> None:
+        self.retention = retention or DebugRetention()
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=self.retention.max_queue)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, img: "np.ndarray", rect: tuple[int, int, int, int], path: str) -> bool:
+        """Ставит изображение в очередь записи.
+
+        `img` не копируется: до записи его нельзя изменять (в обрезке он только читается).
+
+        Args:
+            img (np.ndarray): исходное изображение
+            rect (tuple): x, y, h, w - области (в этом порядке, как в `_save_debug_img`)
+            path (str): путь для сохранения
+
+        Returns:
+            bool: False - очередь заполнена, изображение отброшено
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((img, rect, path))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Очередь отладочных изображений заполнена, '%s' пропущено", path)
+            return False
+
+    def join(self):
+        """Ждёт записи всего, что уже в очереди"""
+        self._queue.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            img, rect, path = self._queue.get()
+            try:
+                self._write(img, rect, path)
+                self._apply_retention(Path(path).parent)
+            except Exception as ex:
+                logger.exception("Не удалось сохранить отладочное изображение:", exc_info=ex)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _write(img: "np.ndarray", rect: tuple[int, int, int, int], path: str):
+        import cv2
+
+        x, y, h, w = rect
+        debug_img = img.copy()
+        cv2.rectangle(debug_img, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.imwrite(path, debug_img)
+
+    def _apply_retention(self, folder: Path):
+        files = []
+        for file in folder.glob(f"{DEBUG_PREFIX}*"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, file))
+        files.sort(reverse=True)  # новые первыми
+
+        total = 0
+        for i, (_, size, file) in enumerate(files):
+            total += size
+            if i >= self.retention.keep_files or total > self.retention.max_bytes:
+                file.unlink(missing_ok=True)
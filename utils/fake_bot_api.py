@@ -0,0 +1,310 @@
+"""Локальная замена Telegram Bot API для нагрузочных тестов (см. `load_test.py`).
+
+Поддерживает то, чем пользуется бот: `getUpdates`, `getFile` и скачивание файлов
+(с `Range`, в том числе оборванное на середине), `sendPhoto`, `sendMediaGroup`, `sendMessage`, `editMessageText`,
+закреп/открепление, удаление, а также ответы 429 с `retry_after` каждые N отправок.
+
+Бот направляется сюда через `telebot.apihelper.API_URL` и `FILE_URL` (`api_url`, `file_url`).
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+SEND_METHODS = frozenset({"sendPhoto", "sendMediaGroup", "sendMessage", "editMessageText"})
+"""Методы, ответ на которые может быть 429 (см. `rate_limit_every`)"""
+
+
+class Call(NamedTuple):
+    """Запрос к серверу (для замеров)"""
+
+    time: float
+    """`time.perf_counter()` на момент ответа"""
+    method: str
+    params: dict[str, str]
+
+
+class FakeBotApi:
+    """HTTP сервер с ответами в формате Bot API, всё хранится в памяти.
+
+    Входящие сообщения для бота добавляются через `push_update`, файлы - через `add_file`.
+    Все запросы бота записываются в `calls` (время, метод, параметры).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate_limit_every: int = 0,
+        retry_after: int = 1,
+        send_delay: float = 0,
+        cut_downloads: int = 0,
+        range_support: bool = True,
+    ) -> None:
+        """
+        Args:
+            host (str, optional): адрес сервера
+            port (int, optional): порт (0 - любой свободный)
+            rate_limit_every (int, optional): каждая N-я отправка в чат получает 429 (0 - нет)
+            retry_after (int, optional): `retry_after` в ответе 429
+            send_delay (float, optional): задержка ответа на отправку (имитация загрузки)
+            cut_downloads (int, optional): столько первых скачиваний файлов обрываются
+                на середине (соединение закрывается раньше `Content-Length`)
+            range_support (bool, optional): учитывать `Range` при скачивании файлов
+                (иначе файл всегда отдаётся целиком с кодом 200)
+        """
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.send_delay = send_delay
+        self.cut_downloads = cut_downloads
+        self.range_support = range_support
+
+        self.calls: list[Call] = []
+        self.counts: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+
+        self._cond = threading.Condition()
+        self._files: dict[str, bytes] = {}
+        self._updates: list[dict] = []
+        self._update_ids = count(1)
+        self._message_ids = count(1)
+        self._sends_per_chat: Counter[str] = Counter()
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.api = self  # type: ignore
+
+    # region адреса
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        """Для `telebot.apihelper.API_URL`"""
+        return self.base_url + "/bot{0}/{1}"
+
+    @property
+    def file_url(self) -> str:
+        """Для `telebot.apihelper.FILE_URL`"""
+        return self.base_url + "/file/bot{0}/{1}"
+
+    # endregion
+
+    def start(self) -> "FakeBotApi":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info("Локальный Bot API: %s", self.base_url)
+        return self
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # region данные для бота
+
+    def add_file(self, data: bytes, width: int = 0, height: int = 0) -> dict:
+        """Сохраняет файл и возвращает `PhotoSize` (JSON) для сообщения"""
+
+        with self._cond:
+            number = len(self._files) + 1
+            file_id = f"file{number}"
+            self._files[file_id] = data
+        return {
+            "file_id": file_id,
+            "file_unique_id": f"unique{number}",
+            "file_size": len(data),
+            "width": width,
+            "height": height,
+        }
+
+    def photo_message(self, photo: dict, user_id: int, media_group_id: str | None = None) -> dict:
+        """Сообщение с фото от пользователя (JSON для `push_update`)"""
+
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "load-test"},
+            "photo": [photo],
+        }
+        if media_group_id:
+            message["media_group_id"] = media_group_id
+        return message
+
+    def push_update(self, message: dict) -> int:
+        """Добавляет сообщение в очередь `getUpdates`"""
+
+        with self._cond:
+            update_id = next(self._update_ids)
+            self._updates.append({"update_id": update_id, "message": message})
+            self._cond.notify_all()
+        return update_id
+
+    # endregion
+
+    def calls_of(self, *methods: str) -> list[Call]:
+        with self._cond:
+            return [call for call in self.calls if call.method in methods]
+
+    # region ответы
+
+    def _message(self, chat_id: str, **fields) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private" if chat_id.isdecimal() else "channel"},
+            **fields,
+        }
+
+    def _get_updates(self, params: dict[str, str]) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + min(float(params.get("timeout") or 0), 1)
+
+        with self._cond:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and (remaining := deadline - time.monotonic()) > 0:
+                self._cond.wait(remaining)
+            return self._updates[:limit]
+
+    def handle(self, method: str, params: dict[str, str]) -> tuple[int, dict]:
+        """Ответ на вызов метода API: HTTP код и JSON"""
+
+        chat = params.get("chat_id", "0")
+        if method in SEND_METHODS:
+            if self.send_delay:
+                time.sleep(self.send_delay)
+            with self._cond:
+                self._sends_per_chat[chat] += 1
+                limited = bool(self.rate_limit_every) and (
+                    self._sends_per_chat[chat] % self.rate_limit_every == 0
+                )
+                if limited:
+                    self.rate_limited[method] += 1
+            if limited:
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+
+        match method:
+            case "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+            case "getUpdates":
+                result = self._get_updates(params)
+            case "getFile":
+                file_id = params.get("file_id", "")
+                if file_id not in self._files:
+                    return 400, {"ok": False, "error_code": 400, "description": "Bad Request"}
+                result = {
+                    "file_id": file_id,
+                    "file_unique_id": file_id.replace("file", "unique"),
+                    "file_size": len(self._files[file_id]),
+                    "file_path": f"photos/{file_id}.jpg",
+                }
+            case "getChat":
+                result = {"id": int(chat), "type": "channel", "title": "load-test"}
+            case "sendPhoto":
+                result = self._message(chat, photo=[])
+            case "sendMediaGroup":
+                media = json.loads(params.get("media") or "[]")
+                result = [self._message(chat, photo=[]) for _ in media]  # type: ignore
+            case "sendMessage" | "editMessageText":
+                result = self._message(chat, text=params.get("text", ""))
+            case (
+                "deleteMessage"
+                | "pinChatMessage"
+                | "unpinChatMessage"
+                | "answerCallbackQuery"
+                | "setWebhook"
+                | "deleteWebhook"
+            ):
+                result = True  # type: ignore
+            case _:
+                return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        return 200, {"ok": True, "result": result}
+
+    def file(self, file_path: str) -> bytes | None:
+        file_id = file_path.rsplit("/", 1)[-1].split(".")[0]
+        return self._files.get(file_id)
+
+    # endregion
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        api: FakeBotApi = self.server.api  # type: ignore
+        url = urlsplit(self.path)
+        # параметры telebot передаёт в строке запроса, тело (файлы) только вычитываем
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        params = dict(parse_qsl(url.query))
+
+        parts = url.path.strip("/").split("/")
+        if parts[0] == "file":
+            self._send_file(api, "/".join(parts[2:]))
+            return
+
+        method = parts[-1]
+        code, body = api.handle(method, params)
+        with api._cond:
+            api.counts[method] += 1
+            api.calls.append(Call(time.perf_counter(), method, params))
+
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_file(self, api: FakeBotApi, file_path: str):
+        data = api.file(file_path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range", "")
+        if api.range_support and range_header.startswith("bytes="):
+            start = int(range_header[6:].split("-")[0] or 0)
+        with api._cond:
+            api.counts["file"] += 1
+            api.calls.append(Call(time.perf_counter(), "file", {"Range": range_header}))
+            cut = api.cut_downloads > 0
+            if cut:
+                api.cut_downloads -= 1
+
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        if cut:
+            # обрыв: половина обещанного и закрытие соединения
+            self.wfile.write(data[start : start + (len(data) - start) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:])
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
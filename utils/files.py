@@ -0,0 +1,47 @@
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+TEMP_SUFFIX = ".tmp"
+"""Суффикс временных файлов (не должен попадать под `IMAGES_GLOB_PATTERN`)"""
+
+
+@contextmanager
+def atomic_writer(path: str | Path) -> Iterator[BinaryIO]:
+    """Открывает на запись временный файл рядом с `path` и при успешном выходе
+    из блока переименовывает его в `path` (после fsync). При ошибке файл удаляется.
+
+    Имя временного файла уникально для процесса и потока, поэтому одновременные записи
+    в один `path` не смешиваются: побеждает последняя, но всегда целиком.
+    Права у файла обычные (по umask), в отличие от `tempfile.mkstemp`.
+
+    Args:
+        path (str | Path): путь к итоговому файлу
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}{TEMP_SUFFIX}")
+    try:
+        with open(tmp_path, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def atomic_write_bytes(path: str | Path, data: bytes):
+    """Атомарно записывает файл: сначала во временный рядом, затем переименовывает.
+
+    Читатели видят либо старый файл (или его отсутствие), либо полностью записанный новый.
+
+    Args:
+        path (str | Path): путь к итоговому файлу
+        data (bytes): содержимое
+    """
+    with atomic_writer(path) as f:
+        f.write(data)
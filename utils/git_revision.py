@@ -0,0 +1,25 @@
+"""Версия кода для результатов замеров (`benchmark.py`, `load_test.py`)."""
+
+import subprocess
+from pathlib import Path
+
+NO_GIT = "nogit"
+"""Коммит, если git недоступен или каталог - не репозиторий"""
+
+
+def current_commit(path: str | Path = Path(__file__).parent) -> str:
+    """Короткий хеш текущего коммита репозитория с `path` (или `NO_GIT`).
+
+    Значение попадает в имена файлов, поэтому вывод git с ошибкой не возвращается."""
+
+    try:
+        proc = subprocess.run(
+            ["git", "-C", str(path), "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError:  # git не установлен
+        return NO_GIT
+    commit = proc.stdout.strip()
+    return commit if proc.returncode == 0 and commit else NO_GIT
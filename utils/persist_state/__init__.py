@@ -1 +1,3 @@
+from .base import PersistStateBase
+from .cached import CachedPersistStateBase
 from .state import State
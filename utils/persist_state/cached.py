@@ -0,0 +1,162 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from logging import Logger
+from pathlib import Path
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from utils.files import atomic_write_bytes
+
+from .base import ENCODING, PersistStateBase
+
+
+class CachedPersistStateBase(PersistStateBase):
+    """Класс для сохранения состояния на диск с отложенной записью.
+
+    В отличие от `PersistStateBase`, чтение атрибутов идёт только из памяти,
+    а изменения копятся и записываются одним атомарным сохранением
+    (временный файл + переименование) не чаще раза в `flush_interval` секунд.
+
+    Файл перечитывается только явно (`_reload`) или по событию изменения файла
+    извне (watchdog, собственные записи не учитываются).
+    Несохранённые изменения записываются при завершении процесса (`atexit`),
+    при необходимости - вызовом `_flush`.
+
+    Подписчики (`_add_listener`) вызываются после каждого изменения в памяти,
+    в том числе после перечитывания файла.
+    """
+
+    def __init__(
+        self,
+        data_path: str | Path = "data/state.json",
+        default_json_path: str = "",
+        logger: Logger | None = None,
+        flush_interval: float = 1.0,
+        watch: bool = True,
+    ) -> None:
+        """Возвращает настроенный экземпляр и создаёт путь для `data_path` (но не сам файл)
+
+        Args:
+            data_path (str, optional): Путь к файлу. По умолчанию: "data/state.json".
+            default_json_path (str, optional): Путь к файлу, из которого следует взять значения,
+                если файл `data_path` пуст.
+            logger (Logger | None, optional): Логгер для целей отладки.
+            flush_interval (float, optional): Задержка записи изменений на диск (сек.).
+            watch (bool, optional): Перечитывать файл при изменении извне.
+        """
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._flush_interval = flush_interval
+        self._wake = threading.Event()
+        self._own_stat: tuple[int, int, int] | None = None
+        self._observer = None
+        self._listeners: list[Callable[[], None]] = []
+
+        super().__init__(data_path, default_json_path, logger)
+
+        if self._data_path.exists() and self._data_path.stat().st_size > 0:
+            self._update_self_from_file()
+
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self._flush)
+
+        if watch:
+            self._observer = Observer()
+            self._observer.schedule(
+                _StateFileHandler(self), self._data_path.parent.as_posix(), recursive=False
+            )
+            self._observer.daemon = True
+            self._observer.start()
+
+    def __getattribute__(self, name: str):
+        # всё читается из памяти, без обращения к файлу
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name: str, value) -> None:
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+
+        with self._lock:
+            object.__setattr__(self, name, value)
+            self._dirty = True
+        self._wake.set()
+        self._debug("Состояние изменено (запись отложена): '%s'='%s'", name, value)
+        self._notify()
+
+    def _add_listener(self, callback: Callable[[], None]):
+        """Подписка на изменения состояния (вызывается из потока, изменившего состояние)"""
+
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as ex:
+                if self._logger:
+                    self._logger.exception("Ошибка подписчика состояния:", exc_info=ex)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait()
+            # копим изменения, пришедшие за интервал, в одну запись
+            time.sleep(self._flush_interval)
+            self._wake.clear()
+            try:
+                self._flush()
+            except Exception as ex:
+                if self._logger:
+                    self._logger.exception("Не удалось сохранить состояние:", exc_info=ex)
+
+    def _flush(self):
+        """Записывает несохранённые изменения в файл (атомарно)"""
+
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._get_public_fields_dict(), ensure_ascii=False, indent=4)
+            atomic_write_bytes(self._data_path, data.encode(ENCODING))
+            self._own_stat = self._stat_key()
+            self._dirty = False
+        self._debug("Состояние сохранено в файл '%s'", self._data_path)
+
+    def _reload(self):
+        """Перечитывает файл (значения из файла заменяют значения в памяти)"""
+
+        with self._lock:
+            if self._data_path.exists() and self._data_path.stat().st_size > 0:
+                self._update_self_from_file()
+                self._own_stat = self._stat_key()
+        self._notify()
+
+    def _stat_key(self) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(self._data_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _on_file_event(self, path: str):
+        if Path(path).resolve() != self._data_path.resolve():
+            return
+        with self._lock:
+            if self._stat_key() in (None, self._own_stat):
+                return  # файла нет или это наша собственная запись
+        self._debug("Файл состояния изменён извне, перечитываем")
+        self._reload()
+
+
+class _StateFileHandler(FileSystemEventHandler):
+    def __init__(self, state: CachedPersistStateBase) -> None:
+        self._state = state
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory or event.event_type not in ("created", "modified", "moved"):
+            return
+        self._state._on_file_event(getattr(event, "dest_path", "") or event.src_path)
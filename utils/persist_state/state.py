@@ -1,22 +1,26 @@
-from .base import PersistStateBase
+from .cached import CachedPersistStateBase
 
 
-class State(PersistStateBase):
-    """Атрибуты класса сохраняются в файл при изменении"""
+class State(CachedPersistStateBase):
+    """Атрибуты класса сохраняются в файл при изменении (с отложенной записью)"""
 
     read_timeout: int
     connect_timeout: int
     number_of_messages_per_day: int
 
-    state_number_of_messages_to_send: int
+    state_number_of_messages_to_send: int = 0
     """Сколько осталось отправить"""
 
-    state_status_message_id: int
+    state_channel_budgets: dict[str, int] | None = None
+    """Сколько осталось отправить в дополнительные каналы (по имени, см. `channels`).
+    Словарь заменяется целиком при каждом изменении (иначе изменение не будет записано)"""
+
+    state_target_channel: str = ""
+    """Канал, в очередь которого идут новые изображения (пусто - основной)"""
+
+    state_status_message_id: int = 0
     """Значения, определяющие состояние:
     - `0`: статус сообщения не должно быть
     - `-1`: статус сообщение нужно создать
     - `{id}`: id, ранее отправленного сообщения
     """
-
-    state_last_status_message_text: str
-    """Чтобы не обновлять такой же текст"""
@@ -0,0 +1,118 @@
+"""Генератор синтетических скриншотов Android для замеров и нагрузочных тестов."""
+
+from collections.abc import Iterator
+from itertools import product
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = [(720, 1600), (1080, 2400), (1440, 3200)]
+"""Ширина и высота типичных экранов"""
+
+NAV_KINDS = ("3-button", "4-button", "gesture", "none")
+"""Варианты навигационной панели"""
+
+_WHITE = (255, 255, 255)
+
+
+def make_screenshot(
+    width: int = 1080,
+    height: int = 2400,
+    nav: str = "3-button",
+    letterbox: bool = True,
+    dark: bool = False,
+    seed: int = 0,
+) -> np.ndarray:
+    """Создаёт синтетический скриншот (BGR).
+
+    Args:
+        width (int, optional): ширина
+        height (int, optional): высота
+        nav (str, optional): навигационная панель, см. `NAV_KINDS`
+        letterbox (bool, optional): чёрные поля вокруг содержимого (как у видео/фото)
+        dark (bool, optional): тёмная тема содержимого
+        seed (int, optional): зерно генератора случайных чисел
+
+    Returns:
+        np.ndarray: изображение
+    """
+    if nav not in NAV_KINDS:
+        raise ValueError(f"Неизвестный вид панели '{nav}', доступны: {NAV_KINDS}")
+
+    rng = np.random.default_rng(seed)
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+
+    nav_height = int(height * 0.06) if nav != "none" else 0
+    screen_bottom = height - nav_height
+
+    # содержимое: фон, "карточки" и строки "текста"
+    top, bottom, left, right = 0, screen_bottom, 0, width
+    if letterbox:
+        top, bottom = int(height * 0.15), screen_bottom - int(height * 0.12)
+        left, right = int(width * 0.04), width - int(width * 0.04)
+
+    background = (40, 40, 45) if dark else (235, 235, 240)
+    img[top:bottom, left:right] = background
+    for _ in range(12):
+        x0 = int(rng.integers(left, right - 20))
+        y0 = int(rng.integers(top, bottom - 20))
+        x1 = int(min(x0 + rng.integers(40, width // 2), right - 1))
+        y1 = int(min(y0 + rng.integers(20, height // 8), bottom - 1))
+        color = tuple(int(c) for c in rng.integers(60 if dark else 90, 200 if dark else 255, 3))
+        cv2.rectangle(img, (x0, y0), (x1, y1), color, thickness=-1)
+    text_color = (200, 200, 200) if dark else (30, 30, 30)
+    line_h = max(height // 80, 6)
+    for y in range(top + line_h, bottom - line_h, line_h * 2):
+        x1 = int(rng.integers(left + (right - left) // 3, right - 4))
+        cv2.line(img, (left + 8, y), (x1, y), text_color, thickness=max(line_h // 3, 1))
+
+    if nav_height:
+        _draw_navigation_bar(img[screen_bottom:], nav)
+
+    return img
+
+
+def _draw_navigation_bar(bar: np.ndarray, nav: str):
+    """Рисует кнопки (или полоску жестов) на тёмной панели"""
+
+    bar_height, width = bar.shape[:2]
+    cy = bar_height // 2
+    size = max(int(width * 0.022), 8)
+    thickness = max(size // 6, 2)
+
+    if nav == "gesture":
+        half = int(width * 0.12)
+        cv2.line(bar, (width // 2 - half, cy), (width // 2 + half, cy), _WHITE, thickness * 2)
+        return
+
+    count = 3 if nav == "3-button" else 4
+    for i in range(count):
+        cx = int(width * (i + 1) / (count + 1))
+        kind = i % 3
+        if kind == 0:  # ◁
+            pts = np.array([[cx + size, cy - size], [cx + size, cy + size], [cx - size, cy]])
+            cv2.polylines(bar, [pts], True, _WHITE, thickness)
+        elif kind == 1:  # ◯
+            cv2.circle(bar, (cx, cy), size, _WHITE, thickness)
+        else:  # ☐
+            cv2.rectangle(bar, (cx - size, cy - size), (cx + size, cy + size), _WHITE, thickness)
+
+
+def iter_cases(seed: int = 0) -> Iterator[tuple[str, np.ndarray]]:
+    """Все сочетания разрешений, панелей, полей и тем: (название, изображение)"""
+
+    for i, ((width, height), nav, letterbox, dark) in enumerate(
+        product(RESOLUTIONS, NAV_KINDS, (True, False), (False, True))
+    ):
+        name = f"{width}x{height}_{nav}_{'letterbox' if letterbox else 'full'}"
+        name += "_dark" if dark else "_light"
+        yield name, make_screenshot(width, height, nav, letterbox, dark, seed=seed + i)
+
+
+def encode(img: np.ndarray, ext: str = ".jpg") -> bytes:
+    """Кодирует изображение, как его присылает Telegram"""
+
+    ok, encoded = cv2.imencode(ext, img)
+    if not ok:
+        raise ValueError(f"Не удалось закодировать изображение в '{ext}'")
+    return encoded.tobytes()
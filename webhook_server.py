@@ -0,0 +1,118 @@
+import hmac
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import TeleBot
+from telebot.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+MAX_BODY_BYTES = 2**20
+"""Обновления Telegram - небольшие JSON (файлы приходят ссылками), больше - не принимаем"""
+
+
+class WebhookServer:
+    """Приём обновлений Telegram через webhook (вместо `infinity_polling`).
+
+    Локальный HTTP сервер принимает POST с JSON обновления на `path`, проверяет
+    секрет из заголовка `X-Telegram-Bot-Api-Secret-Token` и передаёт обновление
+    в `bot.process_new_updates` - дальше те же обработчики, что и при опросе.
+    Ответ отдаётся сразу: обработчики выполняются в потоках бота (`num_threads`).
+
+    Для проверки без Telegram достаточно отправить сохранённое обновление:
+    `curl -H "X-Telegram-Bot-Api-Secret-Token: ..." -d @update.json localhost:8443/webhook`
+    """
+
+    def __init__(
+        self,
+        bot: TeleBot,
+        host: str = "127.0.0.1",
+        port: int = 8443,
+        path: str = "/webhook",
+        secret_token: str = "",
+    ) -> None:
+        """
+        Args:
+            bot (TeleBot): бот с зарегистрированными обработчиками
+            host (str, optional): адрес сервера
+            port (int, optional): порт (0 - любой свободный, см. `server_port`)
+            path (str, optional): путь, на который Telegram присылает обновления
+            secret_token (str, optional): ожидаемый секрет (пусто - не проверяется)
+        """
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+
+        self._server = ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._server.daemon_threads = True
+        self._server.webhook = self  # type: ignore
+
+        if not secret_token:
+            logger.warning("Секрет webhook не задан, обновления принимаются от любого отправителя")
+
+    @property
+    def server_port(self) -> int:
+        return self._server.server_port
+
+    def check_secret(self, value: str | None) -> bool:
+        if not self.secret_token:
+            return True
+        return hmac.compare_digest((value or "").encode(), self.secret_token.encode())
+
+    def serve_forever(self):
+        """Принимает обновления до `shutdown` (блокирует, как `infinity_polling`)"""
+
+        host, port = self._server.server_address[:2]
+        logger.info("Приём обновлений через webhook на http://%s:%s%s", host, port, self.path)
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server: ThreadingHTTPServer
+
+    def do_POST(self):
+        webhook: WebhookServer = self.server.webhook  # type: ignore
+
+        if self.path.split("?")[0] != webhook.path:
+            self._reply(404)
+            return
+        if not webhook.check_secret(self.headers.get(SECRET_HEADER)):
+            webhook.rejected += 1
+            logger.warning("Webhook: неверный секрет от %s", self.client_address[0])
+            self._reply(403)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._reply(413)
+            return
+        try:
+            update = Update.de_json(json.loads(self.rfile.read(length)))
+        except (ValueError, TypeError, KeyError) as ex:
+            logger.warning("Webhook: не удалось разобрать обновление: %s", ex)
+            self._reply(400)
+            return
+
+        webhook.received += 1
+        self._reply(200)  # ответ не ждёт обработки, иначе Telegram будет повторять
+        try:
+            webhook.bot.process_new_updates([update])
+        except Exception as ex:
+            logger.exception("Webhook: ошибка обработки обновления:", exc_info=ex)
+
+    def _reply(self, code: int):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)